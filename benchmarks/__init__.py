@@ -0,0 +1,12 @@
+# ------------------------------------------------------------------------
+# Performance benchmarks of X-Plane importer
+#
+# Run from the repository root:
+#   python -m benchmarks.run --sizes prop,cockpit --output bench.json
+# Object creation is only timed when bpy is available, e.g.:
+#   blender -b --python-expr "import sys; sys.argv[1:] = ['--sizes', 'prop']; \
+#       import runpy; runpy.run_module('benchmarks.run', run_name='__main__')"
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
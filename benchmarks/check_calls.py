@@ -0,0 +1,132 @@
+# ------------------------------------------------------------------------
+# Checks that Blender API traffic of an import doesn't grow with geometry
+#
+# Imports two synthetic files with the same structure but different
+# number of triangles through the bpy stand-in and fails if any API call
+# count differs, i.e. if some code went back to per-vertex or per-key
+# access of Blender data. Also checks that merge mode keeps world space
+# vertex positions of meshes with folded static transforms.
+#
+#   python -m benchmarks.check_calls
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+
+import numpy
+
+from . import fakebpy
+from .synthetic import ObjSpec, writeObj
+
+# Calls which legitimately depend on file size
+IGNORED = {'WindowManager.progress_update'}
+
+
+def _calls(filename):
+    from io_xplane_importer.XPlaneImport import OBJimport
+
+    fakebpy.reset()
+    obj = OBJimport(filename)
+    obj.verbose = 0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        obj.doimport()
+    calls = dict(fakebpy.calls)
+    fakebpy.clearData()
+    return calls
+
+
+# Sibling triangles under different constant translations, see XPMesh.foldStaticTransforms()
+MERGE_OBJ = """I
+800
+OBJ
+%s
+%s
+ANIM_begin
+ANIM_trans 1 0 0 1 0 0 0 0 none
+TRIS 0 3
+ANIM_trans 0 0 5 0 0 5 0 0 none
+TRIS 3 3
+ANIM_trans 0 0 -5 0 0 -5 0 0 none
+TRIS 6 3
+ANIM_end
+""" % ('VT 0 0 0 0 1 0 0 0\nVT 1 0 0 0 1 0 1 0\nVT 0 1 0 0 1 0 0 1\n' * 3,
+       ''.join('IDX %s\n' % i for i in range(9)))
+
+
+def _worldPositions(filename, merge):
+    from io_xplane_importer.XPlaneImport import OBJimport
+
+    obj = OBJimport(filename)
+    obj.verbose = 0
+    obj.merge = merge
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        obj.doimport()
+    bpy = sys.modules['bpy']
+    positions = []
+    for ob in bpy.data.objects:
+        if ob.data is None or not hasattr(ob.data, 'vertices'):
+            continue
+        location = numpy.zeros(3)
+        parent = ob
+        while parent is not None:
+            location += parent.location
+            parent = parent.parent
+        co = numpy.reshape(ob.data.vertices._values['co'], (-1, 3)) + location
+        positions.extend(tuple(float(v) for v in row) for row in co.round(4))
+    fakebpy.clearData()
+    return sorted(set(positions))
+
+
+def _checkMerge(workdir):
+    filename = os.path.join(workdir, 'check_merge.obj')
+    with open(filename, 'w') as f:
+        f.write(MERGE_OBJ)
+    try:
+        (separate, merged) = (_worldPositions(filename, merge) for merge in (1, 2))
+    finally:
+        os.remove(filename)
+    if separate != merged or not separate:
+        print('FAIL:\tmerge mode moves vertices: %s, separate %s' % (merged, separate))
+        return False
+    print('OK:\tmerge mode keeps %s vertex positions' % len(separate))
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that Blender API calls do not scale with geometry')
+    parser.add_argument('--ranges', type=int, default=20)
+    parser.add_argument('--workdir', default=tempfile.gettempdir())
+    args = parser.parse_args(argv)
+
+    fakebpy.install()
+    counts = []
+    for tris in (1000, 10000):
+        filename = os.path.join(args.workdir, 'check_calls_%s.obj' % tris)
+        writeObj(filename, ObjSpec(tris=tris, ranges=args.ranges, animDepth=2))
+        try:
+            counts.append(_calls(filename))
+        finally:
+            os.remove(filename)
+
+    (small, big) = counts
+    failed = False
+    for name in sorted((set(small) | set(big)) - IGNORED):
+        if small.get(name, 0) != big.get(name, 0):
+            print('FAIL:\t%s: %s calls for 1000 triangles, %s for 10000' % (name, small.get(name, 0),
+                                                                          big.get(name, 0)))
+            failed = True
+    if not failed:
+        print('OK:\t%s API calls, independent of geometry size' % sum(big.values()))
+    if not _checkMerge(args.workdir):
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
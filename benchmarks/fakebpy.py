@@ -0,0 +1,398 @@
+# ------------------------------------------------------------------------
+# Lightweight stand-in for bpy and mathutils
+#
+# Lets the whole import pipeline run outside Blender and counts calls of
+# the Blender API, so per-element API traffic shows up in numbers.
+# install() must be called before io_xplane_importer is imported:
+#
+#   from benchmarks import fakebpy
+#   fakebpy.install()
+#   from io_xplane_importer.XPlaneImport import OBJimport
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import math
+import sys
+import types
+from collections import Counter
+
+calls = Counter()  # API name -> number of calls
+
+
+def reset():
+    calls.clear()
+
+
+def _count(name, n=1):
+    calls[name] += n
+
+
+# ------------------------------------------------------------------------
+# -- Data structures --
+# ------------------------------------------------------------------------
+
+class Struct:
+    """Blender struct: counts every attribute write by the element type name."""
+
+    def __init__(self, typeName, **attributes):
+        object.__setattr__(self, '_type', typeName)
+        for (name, value) in attributes.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        _count('%s.%s' % (self._type, name))
+        if isinstance(getattr(self, name, None), list):
+            # Vector properties copy assigned values
+            value = list(value)
+        object.__setattr__(self, name, value)
+
+
+class Collection:
+    """bpy_prop_collection with add() and bulk foreach_set/foreach_get."""
+
+    def __init__(self, typeName, itemType=None, factory=None):
+        self._type = typeName
+        self._itemType = itemType or typeName
+        self._factory = factory
+        self._items = []
+        self._values = {}  # attribute -> flat list set by foreach_set
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        _count('%s[]' % self._type, len(self._items))
+        return iter(self._items)
+
+    def __getitem__(self, key):
+        _count('%s[]' % self._type)
+        if isinstance(key, str):
+            for item in self._items:
+                if getattr(item, 'name', None) == key:
+                    return item
+            raise KeyError(key)
+        return self._items[key]
+
+    def __contains__(self, name):
+        return any(getattr(item, 'name', None) == name for item in self._items)
+
+    def get(self, name, default=None):
+        _count('%s.get' % self._type)
+        for item in self._items:
+            if getattr(item, 'name', None) == name:
+                return item
+        return default
+
+    def _newItem(self, *args, **kwargs):
+        if self._factory:
+            return self._factory(*args, **kwargs)
+        return Struct(self._itemType)
+
+    def add(self, count=None):
+        _count('%s.add' % self._type)
+        if count is None:
+            item = self._newItem()
+            self._items.append(item)
+            return item
+        self._items.extend(self._newItem() for i in range(count))
+
+    def new(self, *args, **kwargs):
+        _count('%s.new' % self._type)
+        item = self._newItem(*args, **kwargs)
+        self._items.append(item)
+        return item
+
+    def remove(self, item, **kwargs):
+        _count('%s.remove' % self._type)
+        self._items.remove(item)
+
+    def link(self, item):
+        _count('%s.link' % self._type)
+        self._items.append(item)
+
+    def append(self, item):
+        _count('%s.append' % self._type)
+        self._items.append(item)
+
+    def foreach_set(self, attribute, values):
+        _count('%s.foreach_set' % self._type)
+        self._values[attribute] = list(values)
+
+    def foreach_get(self, attribute, values):
+        _count('%s.foreach_get' % self._type)
+        values[:] = self._values.get(attribute, [0] * len(values))
+
+
+# ------------------------------------------------------------------------
+# -- ID types --
+# ------------------------------------------------------------------------
+
+def _uniqueName(collection, name):
+    names = {getattr(item, 'name', None) for item in collection._items}
+    if name not in names:
+        return name
+    n = 1
+    while '%s.%03d' % (name, n) in names:
+        n += 1
+    return '%s.%03d' % (name, n)
+
+
+class ID(Struct):
+    def __init__(self, typeName, name, **attributes):
+        super().__init__(typeName, name=name, users=0, **attributes)
+
+
+def _mesh(name):
+    uvLayers = Collection('MeshUVLoopLayers',
+                          factory=lambda name='UVMap', do_init=True: Struct('MeshUVLoopLayer', name=name, data=Collection('MeshUVLoop')))
+    mesh = ID('Mesh', name,
+              vertices=Collection('MeshVertices', 'MeshVertex'),
+              loops=Collection('MeshLoops', 'MeshLoop'),
+              polygons=Collection('MeshPolygons', 'MeshPolygon'),
+              uv_layers=uvLayers,
+              materials=Collection('IDMaterials'))
+    object.__setattr__(mesh, 'update', lambda calc_edges=False, calc_edges_loose=False: _count('Mesh.update'))
+    object.__setattr__(mesh, 'validate', lambda **kwargs: _count('Mesh.validate'))
+    object.__setattr__(mesh, 'normals_split_custom_set_from_vertices',
+                       lambda normals: _count('Mesh.normals_split_custom_set_from_vertices'))
+    return mesh
+
+
+def _fcurve(data_path, index=0, action_group=''):
+    fcurve = Struct('FCurve', data_path=data_path, array_index=index, group=None,
+                    keyframe_points=Collection('FCurveKeyframePoints', 'Keyframe'))
+    object.__setattr__(fcurve, 'update', lambda: _count('FCurve.update'))
+    return fcurve
+
+
+def _action(name):
+    return ID('Action', name,
+              fcurves=Collection('ActionFCurves', factory=_fcurve),
+              groups=Collection('ActionGroups', factory=lambda name: Struct('ActionGroup', name=name)))
+
+
+def _animatable(id):
+    object.__setattr__(id, 'animation_data', None)
+
+    def animation_data_create():
+        _count('%s.animation_data_create' % id._type)
+        if id.animation_data is None:
+            object.__setattr__(id, 'animation_data', Struct('AnimData', action=None))
+        return id.animation_data
+
+    object.__setattr__(id, 'animation_data_create', animation_data_create)
+    return id
+
+
+def _xplane():
+    return Struct('XPlaneObjectSettings', datarefs=Collection('XPlaneDatarefs', 'XPlaneDataref'),
+                  isExportableRoot=False, layer=Struct('XPlaneLayer'))
+
+
+def _object(name, data=None):
+    pose = None
+    if data is not None and data._type == 'Armature':
+        # Pose bones follow bones of the armature
+        pose = Struct('Pose', bones=data.bones._poseBones)
+    return _animatable(ID('Object', name, data=data, parent=None, parent_type='OBJECT', parent_bone='',
+                          location=[0.0, 0.0, 0.0], rotation_mode='XYZ', pose=pose,
+                          rotation_axis_angle=[0.0, 0.0, 1.0, 0.0], rotation_quaternion=[1.0, 0.0, 0.0, 0.0],
+                          empty_display_size=1.0, empty_display_type='PLAIN_AXES', xplane=_xplane()))
+
+
+def _armature(name):
+    bones = Collection('ArmatureBones', 'Bone')
+    bones._poseBones = Collection('PoseBones', 'PoseBone')
+
+    def newBone(name):
+        bones._items.append(Struct('Bone', name=name, xplane=_xplane()))
+        bones._poseBones._items.append(Struct('PoseBone', name=name, rotation_mode='QUATERNION',
+                                              location=[0.0, 0.0, 0.0], rotation_axis_angle=[0.0, 0.0, 1.0, 0.0],
+                                              rotation_quaternion=[1.0, 0.0, 0.0, 0.0]))
+        return Struct('EditBone', name=name, head=(0, 0, 0), tail=(0, 1, 0), roll=0, parent=None,
+                      use_connect=False)
+
+    return _animatable(ID('Armature', name, bones=bones, edit_bones=Collection('ArmatureEditBones', factory=newBone)))
+
+
+def _node(typeName):
+    return Struct(typeName, inputs=_Sockets(), outputs=_Sockets(), image=None)
+
+
+class _Sockets(dict):
+    def __missing__(self, key):
+        socket = Struct('NodeSocket', name=key)
+        self[key] = socket
+        return socket
+
+
+def _material(name):
+    nodes = Collection('Nodes', factory=_node)
+    nodes._items.append(Struct('ShaderNodeBsdfPrincipled', name='Principled BSDF', inputs=_Sockets(),
+                               outputs=_Sockets()))
+    return ID('Material', name, use_nodes=False, specular_intensity=0.5,
+              node_tree=Struct('NodeTree', nodes=nodes,
+                               links=Collection('NodeLinks', factory=lambda a, b: Struct('NodeLink'))))
+
+
+def _image(name):
+    return ID('Image', name, filepath=name)
+
+
+class DataCollection(Collection):
+    """bpy.data collection, new() makes names unique like Blender does."""
+
+    def __init__(self, typeName, factory):
+        super().__init__(typeName)
+        self._idFactory = factory
+
+    def new(self, name, *args, **kwargs):
+        _count('%s.new' % self._type)
+        item = self._idFactory(_uniqueName(self, name), *args, **kwargs)
+        self._items.append(item)
+        return item
+
+    def load(self, filepath, check_existing=False):
+        _count('%s.load' % self._type)
+        item = self._idFactory(_uniqueName(self, filepath.replace('\\', '/').split('/')[-1]))
+        self._items.append(item)
+        return item
+
+
+# ------------------------------------------------------------------------
+# -- mathutils --
+# ------------------------------------------------------------------------
+
+class Vector(list):
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        super().__init__(float(v) for v in values)
+
+    x = property(lambda self: self[0])
+    y = property(lambda self: self[1])
+    z = property(lambda self: self[2])
+
+
+class Euler(Vector):
+    pass
+
+
+class Quaternion(list):
+    def __init__(self, values=(1.0, 0.0, 0.0, 0.0), angle=None):
+        if angle is not None:
+            (x, y, z) = values
+            s = math.sin(angle / 2)
+            values = (math.cos(angle / 2), x * s, y * s, z * s)
+        super().__init__(float(v) for v in values)
+
+
+class Matrix(list):
+    def __init__(self, rows=None):
+        super().__init__(list(r) for r in (rows or [[float(i == j) for j in range(4)] for i in range(4)]))
+
+    @staticmethod
+    def Identity(size):
+        return Matrix([[float(i == j) for j in range(size)] for i in range(size)])
+
+    @staticmethod
+    def Translation(v):
+        m = Matrix.Identity(4)
+        for i in range(3):
+            m[i][3] = v[i]
+        return m
+
+
+# ------------------------------------------------------------------------
+# -- Modules --
+# ------------------------------------------------------------------------
+
+def _function(name, result=None):
+    def f(*args, **kwargs):
+        _count(name)
+        return result
+    return f
+
+
+def _property(*args, **kwargs):
+    return None
+
+
+def _build(xplane2blender):
+    bpy = types.ModuleType('bpy')
+    bpy.app = types.SimpleNamespace(version=(2, 93, 0), version_string='2.93.0 (fake)',
+                                    translations=types.SimpleNamespace(pgettext=lambda s: s))
+    bpy.path = types.SimpleNamespace(abspath=lambda path: path)
+
+    bpy.data = types.SimpleNamespace(
+        meshes=DataCollection('BlendDataMeshes', _mesh),
+        objects=DataCollection('BlendDataObjects', _object),
+        actions=DataCollection('BlendDataActions', _action),
+        armatures=DataCollection('BlendDataArmatures', _armature),
+        materials=DataCollection('BlendDataMaterials', _material),
+        images=DataCollection('BlendDataImages', _image),
+    )
+
+    scene = Struct('Scene', cursor=Struct('View3DCursor', matrix=Matrix.Identity(4)),
+                   collection=Struct('Collection', objects=Collection('CollectionObjects')))
+    object.__setattr__(scene, 'frame_set', _function('Scene.frame_set'))
+    if xplane2blender:
+        history = [types.SimpleNamespace(addon_version=(4, 0, 0), addon_version_clean_str=lambda: '4.0.0')]
+        object.__setattr__(scene, 'xplane', types.SimpleNamespace(xplane2blender_ver_history=history))
+
+    windowManager = types.SimpleNamespace(progress_begin=_function('WindowManager.progress_begin'),
+                                          progress_update=_function('WindowManager.progress_update'),
+                                          progress_end=_function('WindowManager.progress_end'))
+    viewLayer = Struct('ViewLayer', objects=Struct('LayerObjects', active=None))
+    bpy.context = types.SimpleNamespace(scene=scene, window_manager=windowManager, blend_data=bpy.data,
+                                        selected_objects=[], view_layer=viewLayer)
+
+    interpolation = types.SimpleNamespace(enum_items={'CONSTANT': types.SimpleNamespace(value=0),
+                                                      'LINEAR': types.SimpleNamespace(value=1),
+                                                      'BEZIER': types.SimpleNamespace(value=2)})
+    bpy.types = types.SimpleNamespace(
+        Operator=type('Operator', (), {}),
+        OperatorFileListElement=type('OperatorFileListElement', (), {}),
+        Keyframe=types.SimpleNamespace(bl_rna=types.SimpleNamespace(properties={'interpolation': interpolation})),
+        TOPBAR_MT_file_import=Collection('Menu'),
+    )
+    bpy.props = types.SimpleNamespace(StringProperty=_property, BoolProperty=_property, IntProperty=_property,
+                                      FloatProperty=_property, EnumProperty=_property,
+                                      CollectionProperty=_property)
+    bpy.utils = types.SimpleNamespace(register_class=_function('register_class'),
+                                      unregister_class=_function('unregister_class'))
+    bpy.ops = types.SimpleNamespace(object=types.SimpleNamespace(mode_set=_function('ops.object.mode_set')))
+
+    bpyExtras = types.ModuleType('bpy_extras')
+    bpyExtras.io_utils = types.ModuleType('bpy_extras.io_utils')
+    bpyExtras.io_utils.ImportHelper = type('ImportHelper', (), {})
+
+    mathutils = types.ModuleType('mathutils')
+    mathutils.Vector = Vector
+    mathutils.Euler = Euler
+    mathutils.Quaternion = Quaternion
+    mathutils.Matrix = Matrix
+    return bpy, bpyExtras, mathutils
+
+
+def install(xplane2blender=True):
+    """Registers stand-in modules in sys.modules, returns fake bpy.
+
+    xplane2blender - pretend XPlane2Blender 4.0 is installed
+    """
+    if 'io_xplane_importer' in sys.modules:
+        raise RuntimeError('fakebpy.install() must be called before io_xplane_importer is imported')
+    (bpy, bpyExtras, mathutils) = _build(xplane2blender)
+    sys.modules['bpy'] = bpy
+    sys.modules['bpy_extras'] = bpyExtras
+    sys.modules['bpy_extras.io_utils'] = bpyExtras.io_utils
+    sys.modules['mathutils'] = mathutils
+    return bpy
+
+
+def clearData():
+    """Removes all datablocks, e.g. between benchmark runs."""
+    bpy = sys.modules['bpy']
+    for collection in vars(bpy.data).values():
+        collection._items.clear()
+    bpy.context.scene.collection.objects._items.clear()
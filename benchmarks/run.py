@@ -0,0 +1,171 @@
+# ------------------------------------------------------------------------
+# Times phases of importing synthetic OBJ files and writes results as JSON
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy
+
+from .synthetic import SIZES, writeObj
+
+RESULTS_VERSION = 4
+
+bpy = None
+fakebpy = None
+
+
+def _setup(fake):
+    """Imports bpy, or the stand-in from fakebpy if fake is set or Blender is not available."""
+    global bpy, fakebpy
+    if not fake:
+        try:
+            import bpy
+            return
+        except ImportError:
+            pass
+    from . import fakebpy
+    bpy = fakebpy.install()
+
+
+def _parser(filename):
+    from io_xplane_importer.XPlaneImport import OBJimport
+    from io_xplane_importer.XPProfile import ImportProfile
+    parser = OBJimport(filename)
+    parser.verbose = 0
+    parser.profile = ImportProfile(enabled=True)
+    # Objects are created after parsing, so both phases are measured apart
+    parser.streamObjects = False
+    return parser
+
+
+def _checkBuild(parser):
+    # A benchmark of an import without meshes measures nothing
+    if not parser.profile.datablocks['Mesh']:
+        raise RuntimeError('%s: import created no meshes' % parser.filename)
+    if fakebpy:
+        fakebpy.clearData()
+
+
+def _phases(filename):
+    """Runs import of filename, returns dict of phase -> seconds."""
+    parser = _parser(filename)
+    start = time.perf_counter()
+    for step in parser.parseSteps():
+        pass
+    phases = {'parse': time.perf_counter() - start}
+    for name in ('header', 'tokenize', 'geometry'):
+        phases[name] = parser.profile.seconds[name]
+
+    start = time.perf_counter()
+    parser._build()
+    phases['build'] = time.perf_counter() - start
+    _checkBuild(parser)
+    return phases
+
+
+def _tracedPeak(function):
+    # Peak memory in bytes allocated while function runs. Tracing restarts
+    # for every phase, tracemalloc.reset_peak() needs Python 3.9.
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _peakMemory(filename):
+    """Returns peak traced memory in bytes of parsing and building.
+
+    Memory kept from parsing is not counted for building.
+    """
+    parser = _parser(filename)
+    peaks = {'parse': _tracedPeak(parser.parse), 'build': _tracedPeak(parser._build)}
+    _checkBuild(parser)
+    return peaks
+
+
+def apiCalls(filename):
+    """Imports filename with the bpy stand-in, returns dict of API name -> number of calls."""
+    fakebpy.reset()
+    parser = _parser(filename)
+    parser.doimport()
+    calls = dict(sorted(fakebpy.calls.items()))
+    fakebpy.clearData()
+    return calls
+
+
+def runSize(name, spec, workdir, repeat):
+    filename = os.path.join(workdir, 'bench_%s.obj' % name)
+    fileBytes = writeObj(filename, spec)
+    try:
+        runs = []
+        for i in range(repeat):
+            gc.collect()
+            runs.append(_phases(filename))
+        # Best of runs is the least noisy estimate
+        phases = {phase: min(run[phase] for run in runs) for phase in runs[0]}
+        result = {
+            'size': name,
+            'spec': spec.toDict(),
+            'fileBytes': fileBytes,
+            'seconds': phases,
+            'peakBytes': _peakMemory(filename),
+        }
+        if fakebpy:
+            result['apiCalls'] = apiCalls(filename)
+        return result
+    finally:
+        os.remove(filename)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark X-Plane OBJ import')
+    parser.add_argument('--sizes', default='prop,vehicle,cockpit',
+                        help='comma separated list of: %s' % ', '.join(SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=tempfile.gettempdir())
+    parser.add_argument('--output', help='JSON file for results, default - stdout')
+    parser.add_argument('--fake-bpy', action='store_true',
+                        help='build with the bpy stand-in even inside Blender, used outside Blender anyway')
+    args = parser.parse_args(argv)
+
+    _setup(args.fake_bpy)
+    results = {
+        'version': RESULTS_VERSION,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': numpy.__version__,
+        'blender': None if fakebpy else bpy.app.version_string,
+        'machine': platform.platform(),
+        'results': [],
+    }
+    for name in args.sizes.split(','):
+        # Importer messages would mix with JSON results on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            result = runSize(name, SIZES[name], args.workdir, args.repeat)
+        print('%-10s %s' % (name, ' '.join('%s=%.3fs' % item for item in result['seconds'].items())),
+              file=sys.stderr)
+        results['results'].append(result)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
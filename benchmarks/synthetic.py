@@ -0,0 +1,107 @@
+# ------------------------------------------------------------------------
+# Generator of synthetic X-Plane OBJ8 files
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import argparse
+import io
+import numpy
+
+
+class ObjSpec:
+    """Shape of a synthetic OBJ file."""
+
+    def __init__(self, tris=1000, vtPerTri=0.5, ranges=10, animDepth=1, rotateKeys=3, transKeys=2,
+                 textures=('TEXTURE', 'TEXTURE_LIT'), seed=0):
+        self.tris = tris  # number of triangles
+        self.vtPerTri = vtPerTri  # VT lines per triangle, < 3 means shared vertices
+        self.ranges = ranges  # number of TRIS statements
+        self.animDepth = animDepth  # ANIM_begin nesting depth around TRIS, 0 - static
+        self.rotateKeys = rotateKeys  # keys of ANIM_rotate_key tables, 0 - none
+        self.transKeys = transKeys  # keys of ANIM_trans_key tables, 0 - none
+        self.textures = textures  # TEXTURE commands to write
+        self.seed = seed
+
+    def toDict(self):
+        return dict(self.__dict__, textures=list(self.textures))
+
+
+# Sizes from a small prop up to a big airport
+SIZES = {
+    'prop': ObjSpec(tris=2000, ranges=10, animDepth=1),
+    'vehicle': ObjSpec(tris=50000, ranges=100, animDepth=2),
+    'cockpit': ObjSpec(tris=500000, ranges=2000, animDepth=3, rotateKeys=8, transKeys=4),
+    'scenery': ObjSpec(tris=1000000, ranges=500, animDepth=0),
+    'airport': ObjSpec(tris=5000000, ranges=5000, animDepth=1),
+}
+
+
+def _writeArray(out, command, array, fmt):
+    if len(array):
+        buf = io.BytesIO()
+        numpy.savetxt(buf, array, fmt=command + ' ' + ' '.join([fmt] * array.shape[1]))
+        out.write(buf.getvalue())
+
+
+def writeObj(filename, spec):
+    """Writes OBJ8 file for spec, returns its size in bytes."""
+    rng = numpy.random.default_rng(spec.seed)
+    vtCount = max(3, int(spec.tris * spec.vtPerTri))
+    idxCount = spec.tris * 3
+
+    vt = numpy.empty((vtCount, 8))
+    vt[:, 0:3] = rng.uniform(-10, 10, (vtCount, 3))
+    normals = rng.normal(size=(vtCount, 3))
+    vt[:, 3:6] = normals / numpy.linalg.norm(normals, axis=1)[:, None]
+    vt[:, 6:8] = rng.uniform(0, 1, (vtCount, 2))
+    idx = rng.integers(0, vtCount, idxCount)
+
+    with open(filename, 'wb') as out:
+        out.write(b'I\n800\nOBJ\n\n')
+        for (i, texture) in enumerate(spec.textures):
+            out.write(('%s texture_%s.png\n' % (texture, i)).encode())
+        out.write(('POINT_COUNTS %s 0 0 %s\n\n' % (vtCount, idxCount)).encode())
+
+        _writeArray(out, 'VT', vt, '%.4f')
+        out.write(b'\n')
+        tail = len(idx) % 10
+        _writeArray(out, 'IDX10', idx[:len(idx) - tail].reshape(-1, 10), '%d')
+        _writeArray(out, 'IDX', idx[len(idx) - tail:].reshape(-1, 1), '%d')
+        out.write(b'\n')
+
+        bounds = numpy.linspace(0, spec.tris, max(1, spec.ranges) + 1).astype(int) * 3
+        lines = []
+        for (n, (start, end)) in enumerate(zip(bounds[:-1], bounds[1:])):
+            depth = spec.animDepth
+            for level in range(depth):
+                dataref = 'sim/bench/dataref_%s_%s' % (n, level)
+                lines.append('ANIM_begin')
+                if spec.transKeys:
+                    lines.append('ANIM_trans_begin %s' % dataref)
+                    for k in range(spec.transKeys):
+                        lines.append('ANIM_trans_key %s %s 0 %s' % (k, k * 0.1, k * 0.05))
+                    lines.append('ANIM_trans_end')
+                if spec.rotateKeys:
+                    lines.append('ANIM_rotate_begin 0 1 0 %s' % dataref)
+                    for k in range(spec.rotateKeys):
+                        lines.append('ANIM_rotate_key %s %s' % (k, k * 10.0))
+                    lines.append('ANIM_rotate_end')
+            if end > start:
+                lines.append('TRIS %s %s' % (start, end - start))
+            lines.extend(['ANIM_end'] * depth)
+        out.write(('\n'.join(lines) + '\n').encode())
+        return out.tell()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic X-Plane OBJ8 file')
+    parser.add_argument('filename')
+    parser.add_argument('--size', choices=sorted(SIZES), default='prop')
+    parser.add_argument('--tris', type=int, help='override number of triangles')
+    args = parser.parse_args()
+    spec = SIZES[args.size]
+    if args.tris:
+        spec.tris = args.tris
+    print('%s: %s bytes' % (args.filename, writeObj(args.filename, spec)))
@@ -0,0 +1,127 @@
+# ------------------------------------------------------------------------
+# Armature mode of X-Plane importer
+#
+# Every animated mesh and every Empty of an animation group gets a bone of
+# one armature instead of an own object. Bones have rest orientation of
+# the armature, so pose channels use the same axes as object channels.
+# All bone F-curves are in one Action of the armature object, dataref
+# values of XPlane2Blender are kept on bones.
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import bpy
+import numpy
+from os.path import basename
+
+
+# ------------------------------------------------------------------------
+# -- XPArmature --
+# ------------------------------------------------------------------------
+
+class XPArmature:
+    BONE_LENGTH = 0.1  # bones point along Y, so rest orientation is identity
+
+    def __init__(self, objImport):
+        self.objImport = objImport
+        self.bones = []  # (name, parent name, head) in order of creation
+        self.armob = None  # armature Object
+        self.arm = None  # Armature
+        self.action = None  # Action of pose bones
+        self.drefAction = None  # Action of dataref values on bones
+
+    # ------------------------------------------------------------------------
+    def collectBones(self, xpObject, parentBone=None, frame=(0, 0, 0)):
+        # frame - armature space position of the point where children of
+        # xpObject with zero location are placed
+        for ch in xpObject.children:
+            if ch.type == 'Mesh' and (ch.animParams or ch.objdef[0] != 'TRIS'):
+                placement = ch.animation((0, 0, 0))
+                (location, childOffset) = placement[0:2]
+                head = numpy.add(frame, location)
+                ch.bone = ch.name
+                ch.armaturePlacement = placement
+                self.bones.append((ch.bone, parentBone, head))
+                self.collectBones(ch, ch.bone, head + childOffset.totuple())
+            else:
+                # Static objects don't move the frame of their children
+                self.collectBones(ch, parentBone, frame)
+
+    # ------------------------------------------------------------------------
+    def create(self, parentObject):
+        objImport = self.objImport
+        name = basename(objImport.filename)
+        self.arm = bpy.data.armatures.new(name)
+        self.armob = bpy.data.objects.new(name, self.arm)
+        objImport.profile.datablock('Armature')
+        objImport.profile.datablock('Object')
+        objImport.createdData += [('armatures', self.arm), ('objects', self.armob)]
+        self.armob.parent = parentObject
+        bpy.context.scene.collection.objects.link(self.armob)
+
+        # Bones can be added only in edit mode of the active armature
+        bpy.context.view_layer.objects.active = self.armob
+        bpy.ops.object.mode_set(mode='EDIT')
+        editBones = {}
+        for (boneName, parentName, head) in self.bones:
+            editBone = self.arm.edit_bones.new(boneName)
+            editBone.head = tuple(head)
+            editBone.tail = (head[0], head[1] + XPArmature.BONE_LENGTH, head[2])
+            editBone.roll = 0
+            if parentName is not None:
+                editBone.parent = editBones[parentName]
+                editBone.use_connect = False
+            editBones[boneName] = editBone
+        bpy.ops.object.mode_set(mode='OBJECT')
+        objImport.profile.datablock('Bone', len(self.bones))
+
+        self.action = bpy.data.actions.new(name=name)
+        self.armob.animation_data_create().action = self.action
+        objImport.profile.datablock('Action')
+        objImport.createdData.append(('actions', self.action))
+
+        objImport.armob = self.armob
+        objImport.arm = self.arm
+        objImport.action = self.action
+
+    # ------------------------------------------------------------------------
+    def parentToBone(self, ob, bone, location):
+        # Objects parented to a bone are placed relative to its tail
+        ob.parent = self.armob
+        ob.parent_type = 'BONE'
+        ob.parent_bone = bone
+        ob.location = (location[0], location[1] - XPArmature.BONE_LENGTH, location[2])
+
+    # ------------------------------------------------------------------------
+    def addAnimation(self, xpMesh, curves, drefs):
+        bone = xpMesh.bone
+        location = xpMesh.armaturePlacement[0]
+        poseBone = self.armob.pose.bones[bone]
+        prefix = 'pose.bones["%s"].' % bone
+        relative = []
+        for (dataPath, index, values) in curves:
+            if dataPath == "location":
+                # Pose location is relative to the head of the bone
+                values = numpy.asarray(values) - location[index]
+            elif dataPath == "rotation_axis_angle":
+                poseBone.rotation_mode = "AXIS_ANGLE"
+            elif dataPath == "rotation_quaternion":
+                poseBone.rotation_mode = "QUATERNION"
+            relative.append((dataPath, index, values))
+        (curves, constants) = xpMesh.simplifyCurves(relative)
+        xpMesh.setConstants(poseBone, constants)
+        group = self.action.groups.new(bone) if curves else None
+        for (dataPath, index, frames, values) in curves:
+            xpMesh._addFCurve(self.action, prefix + dataPath, index, values, group, frames)
+
+        if drefs and self.objImport.hasXplane2Blender:
+            if self.drefAction is None:
+                self.drefAction = bpy.data.actions.new(name=self.arm.name)
+                self.arm.animation_data_create().action = self.drefAction
+                self.objImport.profile.datablock('Action')
+                self.objImport.createdData.append(('actions', self.drefAction))
+            datarefs = self.arm.bones[bone].xplane.datarefs
+            group = xpMesh._drefGroup(self.drefAction)
+            for (drefName, values) in drefs:
+                xpMesh._addDrefValues(drefName, values, datarefs, self.drefAction, group, 'bones["%s"].' % bone)
@@ -0,0 +1,272 @@
+# ------------------------------------------------------------------------
+# On-disk cache of parsed X-Plane OBJ files
+#
+# Every entry is a .npz file with geometry arrays and the XPObject tree
+# encoded as JSON. manifest.json in the cache directory maps source paths
+# to entries and is used for validation and LRU eviction.
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import numpy
+from .XPlaneUtils import Vertex
+from .XPLog import logger
+from .XPObjects import XPMesh, XPAnimation, XPRootObject
+
+CACHE_VERSION = 2  # Increase when format of entries or parse results changes
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'xplane_importer_cache')
+DEFAULT_SIZE = 512 * 1024 * 1024
+
+
+def importerVersion():
+    from . import bl_info
+    return "%s/%s" % ('.'.join(str(v) for v in bl_info['version']), CACHE_VERSION)
+
+
+def fileHash(filename):
+    h = hashlib.blake2b(digest_size=20)
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# ------------------------------------------------------------------------
+# -- Tree encoding --
+# ------------------------------------------------------------------------
+
+def _encodeValue(value):
+    if isinstance(value, Vertex):
+        return {'vertex': [value.x, value.y, value.z]}
+    if isinstance(value, (list, tuple)):
+        return [_encodeValue(v) for v in value]
+    return value
+
+
+def _decodeValue(value):
+    if isinstance(value, dict):
+        return Vertex(*value['vertex'])
+    if isinstance(value, list):
+        return [_decodeValue(v) for v in value]
+    return value
+
+
+def encodeNode(node):
+    data = {'type': node.type, 'children': [encodeNode(ch) for ch in node.children]}
+    if node.type == 'Mesh':
+        data['name'] = node.name
+        data['objdef'] = list(node.objdef)
+        data['params'] = _encodeValue(node.params + node.animParams)
+    elif node.type == 'Animation':
+        data['name'] = node.name
+    return data
+
+
+def _decodeNode(data, parser):
+    if data['type'] == 'Mesh':
+        node = XPMesh(data['name'], tuple(data['objdef']), parser)
+        for param in _decodeValue(data['params']):
+            node.addParam(param)
+    elif data['type'] == 'Animation':
+        node = XPAnimation(data['name'])
+    else:
+        node = XPRootObject(parser)
+    for ch in data['children']:
+        node.addChild(_decodeNode(ch, parser))
+    return node
+
+
+# ------------------------------------------------------------------------
+# -- ParseCache --
+# ------------------------------------------------------------------------
+
+class ParseCache:
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, directory=None, maxSize=DEFAULT_SIZE):
+        self.directory = directory or DEFAULT_DIRECTORY
+        self.maxSize = maxSize  # in bytes
+        self.version = importerVersion()
+        self.entries = {}  # source path -> entry
+        self.hits = 0
+        self.misses = 0
+        self.changed = False  # entries differ from the manifest, see flush()
+        self._readManifest()
+        self._removeOrphans()
+
+    # ------------------------------------------------------------------------
+    def _readManifest(self):
+        try:
+            with open(os.path.join(self.directory, ParseCache.MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get('version') == self.version:
+            self.entries = manifest['entries']
+
+    def _removeOrphans(self):
+        # Data files without an entry, e.g. of another importer version, would
+        # never be evicted
+        referenced = set(entry['data'] for entry in self.entries.values())
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.npz') and name not in referenced:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------------
+    def _writeManifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, ParseCache.MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'version': self.version, 'entries': self.entries}, f)
+        os.replace(path + '.tmp', path)
+        self.changed = False
+
+    def flush(self):
+        """Writes use times of load() hits to the manifest, e.g. once after a batch of loads."""
+        if self.changed:
+            try:
+                self._writeManifest()
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------------
+    def _dataPath(self, entry):
+        return os.path.join(self.directory, entry['data'])
+
+    # ------------------------------------------------------------------------
+    def _findEntry(self, filename, options):
+        entry = self.entries.get(filename)
+        if entry is None or entry['options'] != options:
+            return None
+        st = os.stat(filename)
+        if entry['size'] != st.st_size:
+            return None
+        if entry['mtime'] != st.st_mtime_ns:
+            # Touched, but maybe not changed
+            if entry['hash'] != fileHash(filename):
+                return None
+            entry['mtime'] = st.st_mtime_ns
+            self.changed = True
+        return entry
+
+    # ------------------------------------------------------------------------
+    def load(self, filename, options=None):
+        """Returns OBJparser with results for filename or None if there is no valid entry.
+
+        Call flush() after loads to keep their LRU order.
+        """
+        from .XPParser import OBJparser
+
+        filename = os.path.abspath(filename)
+        try:
+            entry = self._findEntry(filename, options)
+            if entry is not None:
+                with numpy.load(self._dataPath(entry)) as data:
+                    parser = OBJparser(filename)
+                    parser.verbose = 0
+                    parser.vt = data['vt']
+                    parser.idx = data['idx']
+                    results = json.loads(data['results'].tobytes().decode('utf-8'))
+        except (OSError, ValueError, KeyError):
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        for (name, value) in results['attributes'].items():
+            setattr(parser, name, value)
+        parser.vline = [(Vertex(*v), c) for (v, c) in results['vline']]
+        parser.xpRootObject = _decodeNode(results['tree'], parser)
+        parser.vtBuffer = parser.idxBuffer = None
+
+        # Written by flush() or the next store(), not for every hit
+        entry['used'] = time.time()
+        self.changed = True
+        self.hits += 1
+        return parser
+
+    # ------------------------------------------------------------------------
+    def store(self, filename, parser, options=None, tree=None):
+        """Stores results of parser for filename.
+
+        tree - encoded tree if parser.xpRootObject isn't the parsed one any more, see encodeNode()
+        """
+        try:
+            self._store(os.path.abspath(filename), parser, options, tree)
+        except OSError as e:
+            # The cache is only an optimization, import goes on without it
+            logger.warning('Cannot write parse cache: %s', e)
+
+    # ------------------------------------------------------------------------
+    def _store(self, filename, parser, options, tree):
+        st = os.stat(filename)
+        digest = fileHash(filename)
+        results = {
+            'attributes': {name: getattr(parser, name) for name in
+                           ('fileformat', 'log', 'warnings', 'imageName', 'litTexName', 'normalTexName',
+                            'emptyCount', 'animationCount', 'meshCount')},
+            'vline': [([v.x, v.y, v.z], c) for (v, c) in parser.vline],
+            'tree': tree or encodeNode(parser.xpRootObject),
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        data = digest + '.npz'
+        with open(os.path.join(self.directory, data), 'wb') as f:
+            numpy.savez(f, vt=parser.vt, idx=parser.idx,
+                        results=numpy.frombuffer(json.dumps(results).encode('utf-8'), dtype=numpy.uint8))
+
+        self.entries[filename] = {
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'hash': digest,
+            'options': options,
+            'data': data,
+            'bytes': os.path.getsize(os.path.join(self.directory, data)),
+            'used': time.time(),
+        }
+        self._evict()
+        self._writeManifest()
+
+    # ------------------------------------------------------------------------
+    def _evict(self):
+        # Drop least recently used entries until the cache fits into maxSize.
+        # Files with the same content share one data file.
+        files = {}
+        for entry in self.entries.values():
+            files[entry['data']] = entry['bytes']
+        total = sum(files.values())
+
+        for (filename, entry) in sorted(self.entries.items(), key=lambda item: item[1]['used']):
+            if total <= self.maxSize:
+                break
+            del self.entries[filename]
+            if all(e['data'] != entry['data'] for e in self.entries.values()):
+                total -= entry['bytes']
+                try:
+                    os.remove(self._dataPath(entry))
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------------
+    def clear(self):
+        for entry in self.entries.values():
+            try:
+                os.remove(self._dataPath(entry))
+            except OSError:
+                pass
+        self.entries = {}
+        self._writeManifest()
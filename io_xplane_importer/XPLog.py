@@ -0,0 +1,95 @@
+# ------------------------------------------------------------------------
+# Logging of the importer
+#
+# Messages go to the 'io_xplane_importer' logger with %-style arguments,
+# so they are formatted only when they are really written. Warnings are
+# kept in the log of the import and written as one summary at the end,
+# in chat mode also when they occur, but repeated ones only a few times.
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import logging
+import sys
+
+TRACE = 5  # input lines and the object tree
+logging.addLevelName(TRACE, 'TRACE')
+
+# verbose of importer -> lowest written level: 0-warnings, 1-normal, 2-chat, 3-debug
+VERBOSE_LEVELS = (logging.WARNING, logging.INFO, logging.DEBUG, TRACE)
+
+WARN_REPEAT = 3  # same warning is written at most so many times
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    def emit(self, record):
+        # Look up sys.stdout on every write, like print() does, so redirection works
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+logger = logging.getLogger('io_xplane_importer')
+if not logger.handlers:
+    # Blender doesn't configure logging, write to the system console like print() did
+    _handler = _ConsoleHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter('%(levelname)s:\t%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(TRACE)
+    logger.propagate = False
+
+
+def verboseLevel(verbose):
+    return VERBOSE_LEVELS[max(0, min(verbose, len(VERBOSE_LEVELS) - 1))]
+
+
+# ------------------------------------------------------------------------
+# -- ImportLogging --
+# ------------------------------------------------------------------------
+
+class ImportLogging:
+    """Logging methods of an import, used by OBJparser.
+
+    Needs attributes verbose, log (list of warning texts) and warnings
+    (dict of warning format -> number of occurrences).
+    """
+
+    def isLogged(self, level):
+        return level >= verboseLevel(self.verbose) and logger.isEnabledFor(level)
+
+    def trace(self, msg, *args):
+        if self.isLogged(TRACE):
+            logger.log(TRACE, msg, *args)
+
+    def debug(self, msg, *args):
+        if self.isLogged(logging.DEBUG):
+            logger.debug(msg, *args)
+
+    def info(self, msg, *args):
+        if self.isLogged(logging.INFO):
+            logger.info(msg, *args)
+
+    def warn(self, msg, *args):
+        count = self.warnings.get(msg, 0) + 1
+        self.warnings[msg] = count
+        if count > WARN_REPEAT:
+            return
+        text = msg % args if args else msg
+        self.log.append(text)
+        if self.isLogged(logging.DEBUG):
+            logger.warning('%s', text)
+            if count == WARN_REPEAT:
+                logger.warning('Further warnings like this are suppressed')
+
+    def logSummary(self):
+        """Returns warnings of the import including numbers of suppressed ones."""
+        summary = list(self.log)
+        for (msg, count) in self.warnings.items():
+            if count > WARN_REPEAT:
+                summary.append('%s more: %s' % (count - WARN_REPEAT, msg.replace('%s', '...')))
+        return summary
+
+    def writeSummary(self):
+        summary = self.logSummary()
+        if summary and self.isLogged(logging.WARNING):
+            logger.warning('%s warnings in %s:\n\t%s', len(summary), self.filename, '\n\t'.join(summary))
@@ -2,8 +2,14 @@
 #   Attribution-Noncommercial-Share Alike 3.0
 #   http://creativecommons.org/licenses/by-nc-sa/3.0/
 
-import bpy
-import mathutils
+import hashlib
+import numpy
+try:
+    import bpy
+    import mathutils
+except ImportError:
+    # Parse worker processes run outside of Blender and only build the tree
+    bpy = mathutils = None
 from os.path import basename
 from .XPlaneUtils import Vertex, UV, Face, PanelRegionHandler, getDatarefs
 
@@ -16,6 +22,192 @@ def checkDrefName(drefName: str):
     return False
 
 
+# ------------------------------------------------------------------------
+# -- Keyframes --
+# ------------------------------------------------------------------------
+
+KEYFRAME_INTERPOLATION = 'LINEAR'  # X-Plane interpolates linearly between keys
+_bulkInterpolation = True  # Blender accepts foreach_set for enum 'interpolation'
+
+
+def _setInterpolation(fcu, count):
+    global _bulkInterpolation
+    if _bulkInterpolation:
+        value = bpy.types.Keyframe.bl_rna.properties['interpolation'].enum_items[KEYFRAME_INTERPOLATION].value
+        try:
+            fcu.keyframe_points.foreach_set("interpolation", numpy.full(count, value, dtype=numpy.int32))
+            return
+        except (TypeError, RuntimeError):
+            # Older Blender versions support only bool, int and float properties here
+            _bulkInterpolation = False
+    for kp in fcu.keyframe_points:
+        kp.interpolation = KEYFRAME_INTERPOLATION
+
+
+def addFCurve(action, dataPath, index, values, group=None, frames=None):
+    # Creates F-curve with keys for values on frames, by default 1..n
+    values = numpy.asarray(values, dtype=numpy.float32)
+    count = len(values)
+    fcu = action.fcurves.new(data_path=dataPath, index=index)
+    if group is not None:
+        fcu.group = group
+    fcu.keyframe_points.add(count)
+    co = numpy.empty((count, 2), dtype=numpy.float32)
+    co[:, 0] = numpy.arange(1, count + 1) if frames is None else frames
+    co[:, 1] = values
+    fcu.keyframe_points.foreach_set("co", co.ravel())
+    _setInterpolation(fcu, count)
+    fcu.update()
+    return fcu
+
+
+def decimateKeys(frames, values, tolerance):
+    """Returns mask of keys needed to reproduce values by linear interpolation within tolerance."""
+    keep = numpy.ones(len(values), dtype=bool)
+    if len(values) < 3:
+        return keep
+    # Drop keys on the line of their neighbours, then bring back keys where
+    # dropping several neighbouring ones went beyond tolerance
+    step = (frames[1:-1] - frames[:-2]) / (frames[2:] - frames[:-2])
+    expected = values[:-2] + (values[2:] - values[:-2]) * step
+    keep[1:-1] = numpy.abs(values[1:-1] - expected) > tolerance
+    while True:
+        error = numpy.abs(numpy.interp(frames, frames[keep], values[keep]) - values)
+        missing = (error > tolerance) & ~keep
+        if not missing.any():
+            return keep
+        keep |= missing
+
+
+# ------------------------------------------------------------------------
+# -- Vertices --
+# ------------------------------------------------------------------------
+
+def weldVertices(rows, normals=True):
+    """Returns (verts, inverse) of VT rows merged on a grid of Vertex.LIMIT and UV.LIMIT.
+
+    Positions, normals and UVs are quantized to a fixed grid of the
+    tolerances, rows in one grid cell become one vertex. Close rows in
+    neighbouring cells stay apart, positions and normals are already rounded
+    to the grid by vertexRows(). Without normals only positions and UVs have
+    to match. inverse maps rows to indices into verts.
+    """
+    columns = [rows[:, 0:3] / Vertex.LIMIT]
+    if normals:
+        columns.append(rows[:, 3:6] / Vertex.LIMIT)
+    columns.append(rows[:, 6:8] / UV.LIMIT)
+    keys = numpy.floor(numpy.hstack(columns) + 0.5).astype(numpy.int64)
+    _, first, inverse = numpy.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return rows[first], inverse.reshape(-1)
+
+
+# ------------------------------------------------------------------------
+# -- Transforms --
+# ------------------------------------------------------------------------
+
+def translations(param):
+    # Positions of ANIM_trans param as array, one row per key
+    return numpy.array([(p.x, p.y, p.z) for p in param[1]], dtype=float)
+
+
+def isConstant(param):
+    # Transform that doesn't change with its dataref: a translation with
+    # equal positions or a rotation by zero angles
+    if param[0] == 'ANIM_trans':
+        positions = translations(param)
+        return bool(numpy.all(positions == positions[0]))
+    return not numpy.any(param[2])
+
+
+# ------------------------------------------------------------------------
+# -- Rotations --
+# ------------------------------------------------------------------------
+
+ROTATION_STEP = numpy.radians(15)  # largest rotation between keys of composed rotations
+
+
+def _quaternions(axis, angles):
+    # Quaternions (w, x, y, z) of rotations by angles around axis
+    axis = numpy.asarray(axis, dtype=float)
+    length = numpy.linalg.norm(axis)
+    half = numpy.asarray(angles, dtype=float) / 2
+    q = numpy.zeros((len(half), 4))
+    q[:, 0] = numpy.cos(half)
+    if length > 0:
+        q[:, 1:] = numpy.sin(half)[:, None] * (axis / length)
+    return q
+
+
+def _multiplyQuaternions(a, b):
+    (aw, ax, ay, az) = a.T
+    (bw, bx, by, bz) = b.T
+    return numpy.stack((aw * bw - ax * bx - ay * by - az * bz,
+                        aw * bx + ax * bw + ay * bz - az * by,
+                        aw * by - ax * bz + ay * bw + az * bx,
+                        aw * bz + ax * by - ay * bx + az * bw), axis=1)
+
+
+def _rotateVectors(q, v):
+    # Vector v rotated by every quaternion of q, one row per quaternion
+    (w, u) = (q[:, 0:1], q[:, 1:])
+    t = 2 * numpy.cross(u, v)
+    return v + w * t + numpy.cross(u, t)
+
+
+def _sampleTimeline(timeline, angleLists):
+    # Dataref values between keys of timeline, dense enough that no rotation
+    # turns more than ROTATION_STEP between two of them
+    delta = numpy.max(numpy.abs(numpy.diff(angleLists, axis=1)), axis=0)
+    steps = numpy.maximum(numpy.ceil(delta / ROTATION_STEP), 1).astype(int)
+    samples = [numpy.linspace(timeline[i], timeline[i + 1], steps[i], endpoint=False) for i in range(len(steps))]
+    return numpy.concatenate(samples + [timeline[-1:]])
+
+
+def composeRotations(params):
+    """Returns (values, quaternions, locations) of ANIM_rotate params of one dataref.
+
+    params - rotations and constant translations between them
+    Rotations are applied in the order of the OBJ file, angles of every
+    rotation are interpolated on the common timeline of dataref values.
+    Translations between rotations, like pivots, move the origin along the
+    rotations, locations are its positions on the timeline.
+    """
+    rotations = [p for p in params if p[0] == 'ANIM_rotate']
+    timeline = numpy.unique(numpy.concatenate([numpy.asarray(values, dtype=float)
+                                               for (_, _, _, values, _) in rotations]))
+    if len(timeline) < 2:
+        # Not animated by the dataref, keys follow each other
+        count = max(len(angles) for (_, _, angles, _, _) in rotations)
+        values = numpy.full(count, timeline[0] if len(timeline) else 0.0)
+        angleLists = numpy.array([numpy.resize(angles, count) for (_, _, angles, _, _) in rotations])
+    else:
+        angleLists = []
+        for (_, _, angles, values, _) in rotations:
+            order = numpy.argsort(values)
+            angleLists.append(numpy.interp(timeline, numpy.asarray(values, dtype=float)[order],
+                                           numpy.asarray(angles, dtype=float)[order]))
+        values = _sampleTimeline(timeline, numpy.array(angleLists))
+        angleLists = [numpy.interp(values, timeline, angles) for angles in angleLists]
+
+    q = None
+    locations = numpy.zeros((len(values), 3))
+    offset = numpy.zeros(3)
+    angleLists = iter(angleLists)
+    for param in params:
+        if param[0] == 'ANIM_trans':
+            offset += translations(param)[0]
+            continue
+        if q is not None and offset.any():
+            locations += _rotateVectors(q, offset)
+            offset = numpy.zeros(3)
+        r = _quaternions(param[1], next(angleLists))
+        q = r if q is None else _multiplyQuaternions(q, r)
+    # Keep neighbouring keys in one hemisphere, F-curves interpolate components
+    flip = numpy.cumsum(numpy.einsum('ij,ij->i', q[1:], q[:-1]) < 0) % 2
+    q[1:][flip == 1] *= -1
+    return values, q, locations
+
+
 # ------------------------------------------------------------------------
 # -- XPObject --
 # ------------------------------------------------------------------------
@@ -25,13 +217,46 @@ class XPObject(object):
         self.type = 'None'
         self.children = []
         self.child_offset = Vertex(0, 0, 0)
+        self.bone = None  # name of the bone of this object in armature mode, see XPArmature
 
     def addChild(self, child):
         self.children.append(child)
 
+    def setImporter(self, objImport):
+        # Rebind tree created by OBJparser to the importer that creates Blender objects
+        if hasattr(self, 'objImport'):
+            self.objImport = objImport
+        for ch in self.children:
+            ch.setImporter(objImport)
+
     def doImport(self, parent):
         raise Exception('Call XPObject abstract method')
 
+    def foldStaticTransforms(self):
+        """Moves constant transforms into vertices and children, returns nodes replacing this one."""
+        children = []
+        for ch in self.children:
+            children.extend(ch.foldStaticTransforms())
+        self.children = children
+        return [self]
+
+    def mergeStaticMeshes(self):
+        # Static meshes among children of this object are merged into the first
+        # one with the same material and folded offset, they are placed in the same space
+        merged = {}
+        children = []
+        for ch in self.children:
+            if ch.type == 'Mesh' and ch.isStatic():
+                key = (id(ch.material), None if ch.offset is None else tuple(ch.offset))
+                if key in merged:
+                    merged[key].ranges.extend(ch.ranges)
+                    continue
+                merged[key] = ch
+            children.append(ch)
+        self.children = children
+        for ch in self.children:
+            ch.mergeStaticMeshes()
+
     def printLadder(self, level):
         print(" " * (level * 2) + self.type)
         for ch in self.children:
@@ -50,13 +275,28 @@ class XPRootObject(XPObject):
         self.blenderObject = None
 
     def doImport(self, parent):
+        self.createObject()
+        for ch in self.children:
+            ch.doImport(self)
+
+    def createObject(self):
         # Create root object
         self.blenderObject = bpy.data.objects.new(basename(self.objImport.filename), None)
+        self.objImport.profile.datablock('Object')
+        self.objImport.createdData.append(('objects', self.blenderObject))
         self.blenderObject.location = (0, 0, 0)
         self.blenderObject.empty_display_size = 0.45
         self.blenderObject.empty_display_type = 'PLAIN_AXES'
         bpy.context.scene.collection.objects.link(self.blenderObject)
 
+        if self.objImport.useArmature:
+            from .XPArmature import XPArmature
+            armature = XPArmature(self.objImport)
+            armature.collectBones(self)
+            if armature.bones:
+                armature.create(self.blenderObject)
+                self.objImport.armature = armature
+
         if self.objImport.hasXplane2Blender:
             self.blenderObject.xplane.isExportableRoot = True
             self.blenderObject.xplane.layer.name = basename(self.objImport.filename)
@@ -67,9 +307,6 @@ class XPRootObject(XPObject):
             if self.objImport.normalTex:
                 self.blenderObject.xplane.layer.texture_normal = self.objImport.normalTexName
 
-        for ch in self.children:
-            ch.doImport(self)
-
 # ------------------------------------------------------------------------
 # -- XPAnimation --
 # ------------------------------------------------------------------------
@@ -82,13 +319,11 @@ class XPAnimation(XPObject):
         self.name = name
 
     def doImport(self, parent):
-        lastMesh = None
+        # Animations are children of meshes, they are found here only in place
+        # of an Empty removed by foldStaticTransforms()
         for ch in self.children:
-            if ch.type == 'Mesh':
-                lastMesh = ch
+            if ch.type in ('Mesh', 'Animation'):
                 ch.doImport(parent)
-            elif ch.type == 'Animation':
-                ch.doImport(lastMesh)
             else:
                 raise Exception('Unknown XPObject type')
 
@@ -108,9 +343,12 @@ class XPMesh(XPObject):
         self.type = 'Mesh'
         self.objImport = objImport  # Link to ObjImport class
         self.blenderObject = None  # Link to created Blender object from our data
-        self.faces = []  # Faces defs from OBJ data
+        self.verts = None  # Unique VT rows used by this mesh
+        self.corners = None  # Indices into self.verts of face corners, one row per face
         self.params = []  # List of params for this mesh
         self.animParams = []  # List of animation params for object
+        self.mesh = None  # Blender mesh, may be shared with other XPMesh with equal geometry
+        self.offset = None  # constant translation folded into vertex positions
         self.name = name
 
         # objdef is array of next params:
@@ -118,11 +356,11 @@ class XPMesh(XPObject):
         # [1] - offset in global table
         # [2] - count of elements
         self.objdef = objdef
+        self.ranges = [(objdef[1], objdef[2])]  # (offset, count) of all TRIS merged into this mesh
 
-        self.material = objImport.defaultMat
+        self.material = None  # None - default material of importer
 
-        if objImport.verbose > 0:
-            print("Create XPMesh with def: {} and name {}".format(objdef, self.name))
+        objImport.debug("Create XPMesh with def: %s and name %s", objdef, name)
 
     # ------------------------------------------------------------------------
 
@@ -133,6 +371,40 @@ class XPMesh(XPObject):
 
     # ------------------------------------------------------------------------
 
+    def foldStaticTransforms(self):
+        # Without animation the translations only move vertices and children.
+        # Empties are removed then, their children take their place.
+        if all(isConstant(p) for p in self.animParams) and (self.animParams or self.objdef[0] != 'TRIS'):
+            offset = sum((translations(p)[0] for p in self.animParams if p[0] == 'ANIM_trans'), numpy.zeros(3))
+            self.animParams = []
+            if offset.any():
+                self.offset = offset if self.offset is None else self.offset + offset
+                param = ['ANIM_trans', [Vertex(*offset), Vertex(*offset)], [0, 0], None]
+                for ch in self._frameChildren():
+                    ch.animParams.insert(0, param)
+            if self.objdef[0] != 'TRIS':
+                self.objImport.profile.datablock('Folded empty')
+                return XPObject.foldStaticTransforms(self)[0].children
+        return XPObject.foldStaticTransforms(self)
+
+    def _frameChildren(self):
+        # Meshes placed in the space of this one
+        for ch in self.children:
+            if ch.type == 'Mesh':
+                yield ch
+            else:
+                for mesh in ch.children:
+                    if mesh.type == 'Mesh':
+                        yield mesh
+
+    # ------------------------------------------------------------------------
+
+    def isStatic(self):
+        # Triangles without own animation and without objects depending on them
+        return self.objdef[0] == 'TRIS' and not self.animParams and not self.children
+
+    # ------------------------------------------------------------------------
+
     def addParam(self, param):
         if param[0] in ('ANIM_trans', 'ANIM_rotate'):
             self.animParams.append(param)
@@ -142,199 +414,409 @@ class XPMesh(XPObject):
     # ------------------------------------------------------------------------
 
     def _prepareFaces(self):
-        self.faces = []
+        self.verts = None
+        self.corners = None
         if self.objdef[0].find("Empty") >= 0:
             return
-        for i in range(self.objdef[1], self.objdef[1] + self.objdef[2], 3):
-            face = Face()
-            # points are reversed
-            (vj, uvj, n2) = self.objImport.vt[self.objImport.idx[i + 2]]
-            v = [vj.totuple()]
-            face.addVertex(vj)
-            face.addUV(uvj)
-            (vj, uvj, n1) = self.objImport.vt[self.objImport.idx[i + 1]]
-            v.append(vj.totuple())
-            face.addVertex(vj)
-            face.addUV(uvj)
-            (vj, uvj, n0) = self.objImport.vt[self.objImport.idx[i]]
-            v.append(vj.totuple())
-            face.addVertex(vj)
-            face.addUV(uvj)
-
-            self.faces.append(face)
-        pass
+        idx = self.objImport.idx
+        if len(self.ranges) == 1:
+            (start, count) = self.ranges[0]
+            corners = idx[start:start + count - count % 3]
+        else:
+            corners = numpy.concatenate([idx[start:start + count - count % 3] for (start, count) in self.ranges])
+        # points are reversed
+        corners = corners.reshape(-1, 3)[:, ::-1]
+
+        # Remap used VT indices to a compact local index space. VT rows that
+        # only repeat each other (same position, normal and UV) become one vertex,
+        # so vertices are split only where UVs or normals differ.
+        used, inverse = numpy.unique(corners, return_inverse=True)
+        rows = self.objImport.vt[used] + 0.0  # + 0.0 turns -0.0 into 0.0
+        if self.objImport.weld:
+            self.verts, rowInverse = weldVertices(rows, self.objImport.importNormals)
+        else:
+            self.verts, rowInverse = numpy.unique(rows, axis=0, return_inverse=True)
+        if self.offset is not None:
+            self.verts[:, 0:3] += self.offset
+        corners = rowInverse.reshape(-1)[inverse.reshape(-1)].reshape(-1, 3)
+
+        # Degenerate and duplicate faces would be dropped by Blender anyway
+        valid = (corners[:, 0] != corners[:, 1]) & (corners[:, 1] != corners[:, 2]) & \
+                (corners[:, 0] != corners[:, 2])
+        corners = corners[valid]
+        _, first = numpy.unique(numpy.sort(corners, axis=1), axis=0, return_index=True)
+        self.corners = corners[numpy.sort(first)]
 
     # ------------------------------------------------------------------------
-    def _addDrefValues(self, drefName: str, drefValues):
-        # Adding drefs values to animation
-        dataref = self.blenderObject.xplane.datarefs.add()
+    def _addDrefValues(self, drefName: str, drefValues, datarefs, action, group, pathPrefix=""):
+        # Adding drefs values to animation, datarefs of an object or a bone
+        self._addDataref(datarefs, drefName)
+        self._addFCurve(action, pathPrefix + "xplane.datarefs[%d].value" % (len(datarefs) - 1), 0, drefValues, group)
+
+    @staticmethod
+    def _drefGroup(action):
+        return action.groups.get("XPlane Datarefs") or action.groups.new("XPlane Datarefs")
+
+    @staticmethod
+    def _addDataref(datarefs, drefName):
+        dataref = datarefs.add()
         dataref.path = drefName
         dataref.anim_type = 'transform'
-        if "XPlane Datarefs" not in self.blenderObject.animation_data.action.groups:
-            self.blenderObject.animation_data.action.groups.new('XPlane Datarefs')
-        for (i, value) in enumerate(drefValues):
-            dataref.value = value
-            dataref.keyframe_insert(
-                data_path="value", frame=i + 1, group="XPlane Datarefs")
+
+    # ------------------------------------------------------------------------
+    def simplifyCurves(self, curves):
+        """Returns (curves, constants) without keys reproduced by linear interpolation.
+
+        curves - list of (dataPath, index, frames, values)
+        constants - list of (dataPath, index, value) of curves without change
+        """
+        tolerance = self.objImport.keyframeTolerance
+        simplified = []
+        constants = []
+        with self.objImport.profile.phase('keyframes'):
+            for (dataPath, index, values) in curves:
+                values = numpy.asarray(values, dtype=float)
+                if numpy.ptp(values) <= tolerance:
+                    constants.append((dataPath, index, values[0]))
+                    continue
+                frames = numpy.arange(1, len(values) + 1, dtype=float)
+                keep = decimateKeys(frames, values, tolerance)
+                simplified.append((dataPath, index, frames[keep], values[keep]))
+        self.objImport.profile.datablock('Removed keyframe', sum(len(values) for (_, _, values) in curves) -
+                                        sum(len(values) for (_, _, _, values) in simplified))
+        return simplified, constants
+
+    @staticmethod
+    def setConstants(target, constants):
+        # Values of removed constant curves become static values of target
+        for (dataPath, index, value) in constants:
+            getattr(target, dataPath)[index] = value
+
+    # ------------------------------------------------------------------------
+    def _addFCurve(self, action, dataPath, index, values, group=None, frames=None):
+        profile = self.objImport.profile
+        with profile.phase('keyframes'):
+            addFCurve(action, dataPath, index, values, group, frames)
+        profile.datablock('FCurve')
+        profile.datablock('Keyframe', len(values))
 
     # ------------------------------------------------------------------------
 
     def _createEmptyObject(self, parent):
         ob = bpy.data.objects.new(self.name, None)
+        self.objImport.profile.datablock('Object')
+        self.objImport.createdData.append(('objects', ob))
         ob.empty_display_size = 0.45
         ob.empty_display_type = 'PLAIN_AXES'
-        print("Create empty object: {}, parent type: {}, parent name: {}".format(ob.name, parent.type, parent.blenderObject.name))
+        self.objImport.debug("Create empty object: %s, parent type: %s", ob.name, parent.type)
         return ob
 
     # ------------------------------------------------------------------------
 
+    def _localGeometry(self):
+        # Positions relative to the centre of bounds, so equal parts placed at
+        # different points of the object get equal vertex data
+        positions = self.verts[:, 0:3]
+        origin = numpy.round((positions.min(axis=0) + positions.max(axis=0)) / 2, Vertex.ROUND)
+        return origin, numpy.round(positions - origin, Vertex.ROUND) + 0.0  # + 0.0 turns -0.0 into 0.0
+
+    # ------------------------------------------------------------------------
+    def _geometryKey(self, positions):
+        # Meshes with equal key have equal vertices, faces, UVs, normals and material
+        h = hashlib.blake2b(digest_size=20)
+        h.update(numpy.ascontiguousarray(positions, dtype=numpy.float32).tobytes())
+        h.update(numpy.ascontiguousarray(self.corners, dtype=numpy.int32).tobytes())
+        h.update(numpy.ascontiguousarray(self.verts[:, 6:8]).tobytes())
+        if self.objImport.importNormals:
+            h.update(numpy.ascontiguousarray(self.verts[:, 3:6]).tobytes())
+        material = self.material or self.objImport.defaultMat
+        return (len(positions), len(self.corners), id(material), h.hexdigest())
+
+    # ------------------------------------------------------------------------
     def _createMeshObject(self, parent):
-        self.mesh = bpy.data.meshes.new(self.name)
-        # print("create mesh: {}".format(meshName))
-        self.mesh.use_auto_smooth = True
+        if self.mesh is None:
+            self.mesh = bpy.data.meshes.new(self.name)
+            self.objImport.profile.datablock('Mesh')
+            self.objImport.createdData.append(('meshes', self.mesh))
+            # print("create mesh: {}".format(meshName))
+            if bpy.app.version < (4, 1, 0):
+                # Needed for custom normals, auto smooth is always on since Blender 4.1
+                self.mesh.use_auto_smooth = True
+        else:
+            self.objImport.profile.datablock('Linked mesh')
 
         # Create Blender object for Mesh
         ob = bpy.data.objects.new(self.name, self.mesh)
-        print("Create mesh object: {}, parent: {}".format(ob.name, parent.type))
+        self.objImport.profile.datablock('Object')
+        self.objImport.createdData.append(('objects', ob))
+        self.objImport.debug("Create mesh object: %s, parent: %s", ob.name, parent.type)
         return ob
 
     # ------------------------------------------------------------------------
-    def doImport(self, parent):
-        self._prepareFaces()
+    def _fillMesh(self, positions):
+        # Size all element arrays up front and fill them with flat arrays
+        faceCount = len(self.corners)
+        loopCount = faceCount * 3
 
-        centre = Vertex(0, 0, 0)
-        ob = None
-        if len(self.faces):
-            ob = self._createMeshObject(parent)
-        else:
-            ob = self._createEmptyObject(parent)
+        self.mesh.vertices.add(len(positions))
+        self.mesh.vertices.foreach_set("co", numpy.ascontiguousarray(positions, dtype=numpy.float32).ravel())
 
-        if self.objImport.verbose > 0:
-            print("Import Mesh {} with def: {}".format(ob.name, self.objdef))
+        self.mesh.loops.add(loopCount)
+        self.mesh.loops.foreach_set("vertex_index", numpy.ascontiguousarray(self.corners, dtype=numpy.int32).ravel())
 
-        self.blenderObject = ob
+        self.mesh.polygons.add(faceCount)
+        self.mesh.polygons.foreach_set("loop_start", numpy.arange(0, loopCount, 3, dtype=numpy.int32))
+        if bpy.app.version < (4, 0, 0):
+            # loop_total is read-only since Blender 4.0
+            self.mesh.polygons.foreach_set("loop_total", numpy.full(faceCount, 3, dtype=numpy.int32))
+
+        # Adding UV map for mesh
+        uvLayer = self.mesh.uv_layers.new(name="UVMap", do_init=False)
+        uvLayer.data.foreach_set("uv", numpy.ascontiguousarray(self.verts[self.corners.ravel(), 6:8]).ravel())
+
+        self.mesh.update(calc_edges=True)
 
-        ob.parent = parent.blenderObject
+        if self.objImport.importNormals:
+            # Normals are unique per vertex, so they can be set in one call
+            self.mesh.polygons.foreach_set("use_smooth", numpy.ones(faceCount, dtype=bool))
+            self.mesh.normals_split_custom_set_from_vertices(self.verts[:, 3:6])
 
-        # Reset parenting offset
-        #ob.matrix_parent_inverse = mathutils.Matrix(ob.parent.matrix_world).inverted()
-        # Adding object to current scene
-        bpy.context.scene.collection.objects.link(ob)
+    # ------------------------------------------------------------------------
+    def animation(self, location):
+        """Returns (location, childOffset, centre, curves, drefs) for animParams.
+
+        location - static location of the object in its parent
+        curves - list of (dataPath, index, values) relative to the animated object
+        drefs - list of (drefName, values) of animating datarefs
+
+        Constant translations before the rotation move the object, constant
+        translations after it move the vertices and children (centre and
+        childOffset), like the pivot translations AC3D writes around rotations.
+        Pivots between composed rotations of one dataref animate the location.
+        """
+        location = numpy.array(location, dtype=float)
+        before = numpy.zeros(3)
+        after = numpy.zeros(3)
+        curves = []
+        drefs = []
+        locations = None
+
+        hasRotation = False
+        rotated = False
+
+        # Several rotations by one dataref are composed to quaternion keys on
+        # a common timeline, translations of the dataref are sampled on it too
+        timeline = None
+        composed = ()  # indices of animParams in the composed rotations
+        rotations = [p for p in self.animParams if p[0] == 'ANIM_rotate']
+        if len(rotations) > 1:
+            composed = self._composedRotations(rotations)
+            if composed:
+                (timeline, q, pivots) = composeRotations(self.animParams[composed[0]:composed[-1] + 1])
+                for n in range(0, 4):
+                    curves.append(("rotation_quaternion", n, q[:, n]))
+                if checkDrefName(rotations[0][-1]):
+                    drefs.append((rotations[0][-1], timeline))
+                if pivots.any():
+                    locations = pivots
+                hasRotation = True
+            else:
+                self.objImport.warn('Only the first of rotations by different datarefs or with animated '
+                                    'translations between them is imported')
+
+        for (i, animParam) in enumerate(self.animParams):
+            self.objImport.debug("Current anim: %s, dref: %s", animParam[0], animParam[-1])
+            if animParam[0] == 'ANIM_trans':
+                (_, positions, values, drefName) = animParam
+                positions = translations(animParam)
+                if isConstant(animParam):
+                    if i in composed:
+                        # Pivot, in the locations of the composed rotations
+                        continue
+                    if rotated:
+                        after += positions[0]
+                    else:
+                        before += positions[0]
+                    continue
+
+                if timeline is not None and timeline[0] != timeline[-1] and drefName == rotations[0][-1]:
+                    order = numpy.argsort(values)
+                    positions = numpy.array([numpy.interp(timeline, numpy.asarray(values, dtype=float)[order],
+                                                          positions[order, n]) for n in range(0, 3)]).T
+                    values = timeline
+                if locations is None:
+                    locations = positions
+                elif locations.shape == positions.shape:
+                    locations = locations + positions
+                else:
+                    self.objImport.warn('Only the first of translations with different keys is imported')
+                    continue
+                if checkDrefName(drefName):
+                    drefs.append((drefName, values))
+
+            elif animParam[0] == 'ANIM_rotate':
+                rotated = True
+                if hasRotation:
+                    # Composed above or not supported
+                    continue
+                hasRotation = True
+
+                (_, p, angles, values, drefName) = animParam
+                curves.append(("rotation_axis_angle", 0, angles))  # W - value
+                for n in range(1, 4):
+                    curves.append(("rotation_axis_angle", n, numpy.full(len(angles), p[n-1])))
+                if checkDrefName(drefName):
+                    drefs.append((drefName, values))
+
+        location = location + before
+        if locations is not None:
+            locations = locations + location
+            for n in range(0, 3):
+                curves.append(("location", n, locations[:, n]))
+        childOffset = Vertex(self.child_offset.x + after[0], self.child_offset.y + after[1],
+                             self.child_offset.z + after[2])
+        centre = Vertex(-after[0], -after[1], -after[2])
+        return location, childOffset, centre, curves, drefs
+
+    def _composedRotations(self, rotations):
+        # Range of animParams from the first to the last rotation if they can
+        # be composed: rotations by one dataref, constant translations between
+        if any(p[-1] != rotations[0][-1] for p in rotations):
+            return ()
+        indices = [i for (i, p) in enumerate(self.animParams) if p[0] == 'ANIM_rotate']
+        composed = range(indices[0], indices[-1] + 1)
+        if all(self.animParams[i][0] == 'ANIM_rotate' or isConstant(self.animParams[i]) for i in composed):
+            return composed
+        return ()
 
-        ob.location = (parent.child_offset.x, parent.child_offset.y, parent.child_offset.z)
+    # ------------------------------------------------------------------------
+    def _placeObject(self, ob, parent, location):
+        # Parent ob to the Blender object of parent, or to its bone in armature mode
+        if parent.bone is not None:
+            self.objImport.armature.parentToBone(ob, parent.bone, location)
+        else:
+            ob.parent = parent.blenderObject
+            ob.location = location
 
-        if len(self.animParams):
-            print('Mesh has animation')
-            anim_data = ob.animation_data_create()
-            anim_data.action = bpy.data.actions.new(name=ob.name)
+    # ------------------------------------------------------------------------
+    def doImport(self, parent):
+        with self.objImport.profile.phase('geometry'):
+            self._prepareFaces()
+
+        centre = Vertex(0, 0, 0)
+        ob = None
+        hasFaces = self.corners is not None and len(self.corners) > 0
+
+        # Static meshes get their origin at the centre of their geometry, so
+        # repeated parts can use one mesh as linked duplicates
+        origin = None
+        geometryKey = None
+        if hasFaces and self.objImport.shareMeshes and not self.animParams:
+            with self.objImport.profile.phase('geometry'):
+                (origin, positions) = self._localGeometry()
+                geometryKey = self._geometryKey(positions)
+            self.mesh = self.objImport.sharedMeshes.get(geometryKey)
+
+        if self.bone is not None:
+            # Bone carries the animation, the object only the geometry
+            (_, self.child_offset, centre, curves, drefs) = self.armaturePlacement
+            if hasFaces:
+                ob = self._createMeshObject(parent)
+                bpy.context.scene.collection.objects.link(ob)
+                self.objImport.armature.parentToBone(ob, self.bone, (0, 0, 0))
+            self.objImport.armature.addAnimation(self, curves, drefs)
+        else:
+            if hasFaces:
+                ob = self._createMeshObject(parent)
+            else:
+                ob = self._createEmptyObject(parent)
 
-            hasRotation = False
-            off = None
+            # Adding object to current scene
+            bpy.context.scene.collection.objects.link(ob)
 
-            needPosReFix = False
-            reFixDone = False  # Ignore second position fix. 
+            location = parent.child_offset.totuple()
+            if origin is not None:
+                location = (location[0] + origin[0], location[1] + origin[1], location[2] + origin[2])
+                self.child_offset = Vertex(-origin[0], -origin[1], -origin[2])
+            self._placeObject(ob, parent, location)
 
-            for animParam in self.animParams:
-                print("Current anim: {}, dref: {}".format(animParam[0], animParam[3]))
-                if animParam[0] == 'ANIM_trans':
-                    (_, positions, values, drefName) = animParam
+            if len(self.animParams):
+                self.objImport.debug('Mesh has animation')
+                (location, self.child_offset, centre, curves, drefs) = self.animation(ob.location)
+                ob.location = tuple(location)
+                self._addAnimation(ob, curves, drefs)
 
-                    if not positions[0].equals(positions[1]):
-                        for n in range(0, 3):
-                            fcu_z = anim_data.action.fcurves.new(data_path="location", index=n)
-                            fcu_z.keyframe_points.add(len(positions))
-                            for i in range(len(positions)):
-                                fcu_z.keyframe_points[i].co = i + 1, positions[i].toVector(3)[n] + ob.location[n]
-                        if checkDrefName(drefName):
-                            self._addDrefValues(drefName, values)
-                    else:
-                        # Some time AC3D create dummy translate animation to move object to right place
-
-                        if needPosReFix == False:
-                            if reFixDone == False:
-                                # Fix for object position by dummy ANIM_trans
-                                off = positions[0]
-                                ob.location = (off.x + ob.location[0], off.y + ob.location[1], off.z + ob.location[2])
-                                print("Fix object position to {}".format(off))
-                                self.child_offset = Vertex(-off.x, -off.y, -off.z)
-                                needPosReFix = True
-
-                        else:
-                            if reFixDone == False:
-                                #centre = Vertex(positions[1].x, positions[1].y, positions[1].z)
-                                centre = off
-                                needPosReFix = False
-                                reFixDone = True
-
-                elif animParam[0] == 'ANIM_rotate':
-                    if hasRotation:
-                        # TODO: fix many rotate animations
-                        continue
-                    hasRotation = True
-                    # (_, matrix, values, drefName) = animParam
-                    # for n in range(0, 4):
-                    #     fcu_z = anim_data.action.fcurves.new(data_path="rotation_quaternion", index=n)
-                    #     fcu_z.keyframe_points.add(len(matrix))
-                    #     for i in range(len(matrix)):
-                    #         fcu_z.keyframe_points[i].co = i + 1, matrix[i].to_quaternion()[n]
-                    # self._addDrefValues(drefName, values)
-
-                    # for n in range(0, 3):
-                    #     fcu_z = ob.animation_data.action.fcurves.new(data_path="rotation_euler", index=n)
-                    #     fcu_z.keyframe_points.add(len(matrix))
-                    #     for i in range(len(matrix)):
-                    #         fcu_z.keyframe_points[i].co = i + 1, matrix[i].to_euler()[n]
-
-                    (_, p, matrix, values, drefName) = animParam
-                    ob.rotation_mode = "AXIS_ANGLE"
-                    for n in range(0, 4):
-                        fcu_z = ob.animation_data.action.fcurves.new(data_path="rotation_axis_angle", index=n)
-                        fcu_z.keyframe_points.add(len(matrix))
-                        for i in range(len(matrix)):
-                            if n == 0:
-                                fcu_z.keyframe_points[i].co = i + 1, matrix[i]  # W - value
-                            else:
-                                fcu_z.keyframe_points[i].co = i + 1, p[n-1]
-
-                    if checkDrefName(drefName):
-                        self._addDrefValues(drefName, values)
-
-        if len(self.faces):
-            _faces = []
-            _verts = []
-            for f in self.faces:
-                face = []
-                for v in f.v:
-                    face.append(len(_verts))
-                    if centre.x == 0:
-                        pass
-                    _verts.append([v.x - centre.x, v.y - centre.y, v.z - centre.z])
-                _faces.append(face)
-
-            # Adding varticles and faces to mesh
-            self.mesh.from_pydata(_verts, [], _faces)
-            # Validate mesh after data assigment
-            self.mesh.validate()
-
-            # Adding UV map for mesh
-            self.mesh.uv_layers.new(name="UVMap", do_init=False)
-            uvs = []
-            for face in self.faces:
-                for uv in face.uv:
-                    uvs.append((uv.s, uv.t))
-
-            i = 0
-            for uvdata in self.mesh.uv_layers.active.data:
-                uvdata.uv = uvs[i]
-                i += 1
+        self.blenderObject = ob
+        if ob is not None:
+            self.objImport.debug("Import Mesh %s with def: %s", ob.name, self.objdef)
+
+        if geometryKey is not None and geometryKey in self.objImport.sharedMeshes:
+            self.objImport.nprim += 1
+        elif hasFaces:
+            if origin is None:
+                positions = self.verts[:, 0:3] - (centre.x, centre.y, centre.z)
+            with self.objImport.profile.phase('geometry'):
+                self._fillMesh(positions)
+            self.objImport.nprim += 1
 
             # Adding material for Mesh
-            self.mesh.materials.append(self.material.getBlenderMat(True))
+            material = self.material or self.objImport.defaultMat
+            self.mesh.materials.append(material.getBlenderMat(True))
+            if geometryKey is not None:
+                self.objImport.sharedMeshes[geometryKey] = self.mesh
 
-            self.mesh.calc_normals()
-            self.mesh.update(calc_edges=True)
+        # Geometry is in the Blender mesh now
+        self.verts = self.corners = None
 
         for ch in self.children:
             ch.doImport(self)
 
-        pass
+    # ------------------------------------------------------------------------
+    def _animationKey(self, curves, drefs):
+        # Objects with equal key can use one Action
+        h = hashlib.blake2b(digest_size=20)
+        for (dataPath, index, frames, values) in curves:
+            h.update(("%s[%d]:" % (dataPath, index)).encode())
+            h.update(numpy.ascontiguousarray(frames, dtype=numpy.float32).tobytes())
+            h.update(numpy.ascontiguousarray(values, dtype=numpy.float32).tobytes())
+        for (drefName, values) in drefs:
+            h.update(("%s:" % drefName).encode())
+            h.update(numpy.ascontiguousarray(values, dtype=numpy.float32).tobytes())
+        return (len(curves), len(drefs), h.hexdigest())
+
+    # ------------------------------------------------------------------------
+    def _addAnimation(self, ob, curves, drefs):
+        objImport = self.objImport
+        if not objImport.hasXplane2Blender:
+            drefs = []
+        for (dataPath, index, values) in curves:
+            if dataPath == "rotation_axis_angle":
+                ob.rotation_mode = "AXIS_ANGLE"
+            elif dataPath == "rotation_quaternion":
+                ob.rotation_mode = "QUATERNION"
+        (curves, constants) = self.simplifyCurves(curves)
+        self.setConstants(ob, constants)
+        if not curves and not drefs:
+            return
+        anim_data = ob.animation_data_create()
+
+        key = self._animationKey(curves, drefs) if objImport.shareActions else None
+        action = objImport.sharedActions.get(key)
+        if action is not None:
+            # Datarefs are properties of the object, only their F-curves are shared
+            for (drefName, values) in drefs:
+                self._addDataref(ob.xplane.datarefs, drefName)
+            anim_data.action = action
+            objImport.profile.datablock('Linked action')
+            return
+
+        anim_data.action = bpy.data.actions.new(name=ob.name)
+        objImport.profile.datablock('Action')
+        objImport.createdData.append(('actions', anim_data.action))
+        for (dataPath, index, frames, values) in curves:
+            self._addFCurve(anim_data.action, dataPath, index, values, frames=frames)
+        group = self._drefGroup(anim_data.action) if drefs else None
+        for (drefName, values) in drefs:
+            self._addDrefValues(drefName, values, ob.xplane.datarefs, anim_data.action, group)
+        if key is not None:
+            objImport.sharedActions[key] = anim_data.action
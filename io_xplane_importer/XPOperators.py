@@ -0,0 +1,324 @@
+# ------------------------------------------------------------------------
+# Blender operators of X-Plane importer
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import bpy
+import cProfile
+import os
+import tempfile
+import time
+from bpy_extras.io_utils import ImportHelper
+from os.path import basename, dirname, join, normpath
+from . import XPlaneImport
+from .XPCache import ParseCache
+from .XPProfile import ImportProfile
+from .XPLog import logger
+
+
+#operators
+class ImportXObjFile(bpy.types.Operator, ImportHelper):
+    bl_idname = "xplaneimporter.obj"        # Unique identifier for buttons and menu items to reference.
+    bl_label = "Import X-Plane OBJ"         # Display name in the interface.
+    bl_options = {'UNDO'}  # Enable undo for the operator.
+    filename_ext = ".obj"
+    SLICE_SECONDS = 0.1  # work between redraws of a modal import
+
+    filter_glob: bpy.props.StringProperty(
+        default="*.obj",
+        options={'HIDDEN'},
+        maxlen=255,  # Max internal buffer length, longer would be clamped.
+    )
+    files: bpy.props.CollectionProperty(
+        type=bpy.types.OperatorFileListElement,
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+    directory: bpy.props.StringProperty(
+        subtype='DIR_PATH',
+        options={'HIDDEN', 'SKIP_SAVE'},
+    )
+    import_normals: bpy.props.BoolProperty(
+        name="Import Normals",
+        description="Use normals from the OBJ file as custom split normals",
+        default=True,
+    )
+    weld_vertices: bpy.props.BoolProperty(
+        name="Weld Vertices",
+        description="Merge vertices whose positions, normals and UVs fall into one cell of a fine grid",
+        default=True,
+    )
+    share_meshes: bpy.props.BoolProperty(
+        name="Share Meshes",
+        description="Objects with equal static geometry use one mesh as linked duplicates",
+        default=True,
+    )
+    share_actions: bpy.props.BoolProperty(
+        name="Share Actions",
+        description="Animated objects with equal keyframes and datarefs use one Action",
+        default=True,
+    )
+    merge: bpy.props.EnumProperty(
+        name="Objects",
+        description="How TRIS statements become Blender objects",
+        items=(
+            ('1', "Separate", "Every TRIS statement is a new object"),
+            ('2', "Merge Static", "Merge static triangles with the same parent and material into one object"),
+        ),
+        default='1',
+    )
+    keyframe_tolerance: bpy.props.FloatProperty(
+        name="Keyframe Tolerance",
+        description="Keys that linear interpolation reproduces within this tolerance are removed, "
+                    "curves changing less are replaced by a static value",
+        default=0.0001,
+        min=0.0,
+        precision=5,
+    )
+    use_armature: bpy.props.BoolProperty(
+        name="Armature",
+        description="Import animations as bones of one armature instead of chains of animated objects",
+        default=False,
+    )
+    stream_objects: bpy.props.BoolProperty(
+        name="Create While Reading",
+        description="Create objects while the rest of the file is read. Merge Static and Armature modes "
+                    "need the whole file first, they create objects after reading",
+        default=True,
+    )
+    use_modal: bpy.props.BoolProperty(
+        name="Responsive Import",
+        description="Import a single file in short time slices, Blender stays responsive and Esc cancels the import",
+        default=False,
+    )
+    import_directory: bpy.props.BoolProperty(
+        name="Whole Directory",
+        description="Import all OBJ files in the directory and its subdirectories",
+        default=False,
+    )
+    workers: bpy.props.IntProperty(
+        name="Parse Processes",
+        description="Number of processes parsing files of a batch import or big geometry blocks of one file, "
+                    "0 - one per CPU core",
+        default=0,
+        min=0,
+    )
+    use_cache: bpy.props.BoolProperty(
+        name="Use Parse Cache",
+        description="Keep parsed files on disk and skip parsing of unchanged files",
+        default=True,
+    )
+    cache_directory: bpy.props.StringProperty(
+        name="Cache Directory",
+        description="Directory of the parse cache, empty - temporary directory",
+        subtype='DIR_PATH',
+        default="",
+    )
+    cache_size: bpy.props.IntProperty(
+        name="Cache Size (MB)",
+        description="Least recently used files are removed from the cache above this size",
+        default=512,
+        min=1,
+    )
+    profile: bpy.props.BoolProperty(
+        name="Profile Import",
+        description="Measure time and allocations of import phases, write them to a JSON file",
+        default=False,
+    )
+    profile_python: bpy.props.BoolProperty(
+        name="Python Profile",
+        description="Also record a cProfile capture of the import, readable by pstats",
+        default=False,
+    )
+    profile_directory: bpy.props.StringProperty(
+        name="Profile Directory",
+        description="Directory for profile files, empty - temporary directory",
+        subtype='DIR_PATH',
+        default="",
+    )
+
+    def _cache(self):
+        if not self.use_cache:
+            return None
+        return ParseCache(bpy.path.abspath(self.cache_directory), self.cache_size * 1024 * 1024)
+
+    def _batchFiles(self):
+        directory = self.directory or dirname(self.filepath)
+        if self.import_directory:
+            return XPlaneImport.findObjFiles(directory)
+        if len(self.files) > 1:
+            return [join(directory, f.name) for f in self.files]
+        return []
+
+    def _importOptions(self):
+        # OBJimport attributes set from operator properties
+        return {
+            'weld': self.weld_vertices,
+            'shareMeshes': self.share_meshes,
+            'shareActions': self.share_actions,
+            'merge': int(self.merge),
+            'useArmature': self.use_armature,
+            'streamObjects': self.stream_objects,
+            'keyframeTolerance': self.keyframe_tolerance,
+        }
+
+    def _profilePath(self, name, ext):
+        directory = bpy.path.abspath(self.profile_directory) or tempfile.gettempdir()
+        return join(directory, basename(name) + ext)
+
+    def _reportProfile(self, name, profile, pythonProfile):
+        # Write profile files named after the imported file or directory
+        if pythonProfile is not None:
+            path = self._profilePath(name, '.pstats')
+            pythonProfile.dump_stats(path)
+            self.report({'INFO'}, "Python profile written to %s" % path)
+        if not self.profile:
+            return
+        for line in profile.report():
+            self.report({'INFO'}, line)
+        path = self._profilePath(name, '.profile.json')
+        try:
+            profile.write(path)
+        except OSError as e:
+            self.report({'WARNING'}, "Cannot write profile: %s" % e)
+        else:
+            self.report({'INFO'}, "Import profile written to %s" % path)
+
+    def _executeBatch(self, filenames, profile):
+        results = XPlaneImport.importFiles(filenames, self.workers, self.import_normals, cache=self._cache(),
+                                           profile=profile, options=self._importOptions())
+        errors = [(filename, msg) for (filename, msg) in results if msg is not None]
+        for (filename, msg) in errors:
+            self.report({'WARNING'}, "%s: %s" % (filename, msg))
+        self.report({'INFO'}, "Imported %s of %s X-Plane OBJ files." % (len(results) - len(errors), len(results)))
+        return {'FINISHED'} if len(errors) < len(results) else {'CANCELLED'}
+
+    def execute(self, context):
+        if not len(bpy.context.selected_objects) == 0:
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+        profile = ImportProfile(enabled=self.profile)
+        pythonProfile = cProfile.Profile() if self.profile_python else None
+        filenames = self._batchFiles()
+        if not filenames and self.use_modal:
+            return self._startModal(context, profile, pythonProfile)
+
+        if pythonProfile is not None:
+            pythonProfile.enable()
+        try:
+            if filenames:
+                resultVal = self._executeBatch(filenames, profile)
+            else:
+                resultVal = self._executeFile(profile)
+        finally:
+            if pythonProfile is not None:
+                pythonProfile.disable()
+        name = normpath(self.directory or dirname(self.filepath)) if filenames else self.filepath
+        self._reportProfile(name, profile, pythonProfile)
+        return resultVal
+
+    def _newImport(self, profile):
+        obj=XPlaneImport.OBJimport(self.filepath)
+        obj.importNormals = self.import_normals
+        for (name, value) in self._importOptions().items():
+            setattr(obj, name, value)
+        obj.cache = self._cache()
+        # Big geometry blocks are parsed by the processes of batch imports
+        obj.chunkWorkers = self.workers or os.cpu_count() or 1
+        obj.executable = getattr(bpy.app, 'binary_path_python', None)
+        obj.profile = profile
+        return obj
+
+    def _executeFile(self, profile):
+        obj = self._newImport(profile)
+        resultVal = {'CANCELLED'}
+        try:
+            obj.doimport()
+        except XPlaneImport.ParseError as e:
+            logger.error("%s", e.message())
+            # Objects may be created before the error, see BuildStage
+            obj.removeCreatedData()
+        else:
+            resultVal = {'FINISHED'}
+            self.report({'INFO'}, "Import of X-Plane OBJ finished, %s primitives." % obj.nprim)
+
+        return resultVal
+
+    # ------------------------------------------------------------------------
+    # Modal import: OBJimport.importSteps() runs in slices on timer events
+
+    def _startModal(self, context, profile, pythonProfile):
+        self._import = self._newImport(profile)
+        self._steps = self._import.importSteps()
+        self._pythonProfile = pythonProfile
+        self._started = time.perf_counter()
+        wm = context.window_manager
+        wm.progress_begin(0, 1)
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def _endModal(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        self._steps = None
+
+    def _runSlice(self):
+        # Returns False when the import is finished
+        end = time.perf_counter() + ImportXObjFile.SLICE_SECONDS
+        if self._pythonProfile is not None:
+            self._pythonProfile.enable()
+        try:
+            while time.perf_counter() < end:
+                next(self._steps)
+        except StopIteration:
+            return False
+        finally:
+            if self._pythonProfile is not None:
+                self._pythonProfile.disable()
+        return True
+
+    def _statusText(self):
+        fraction = self._import.fraction
+        text = "Importing %s: %d%%" % (basename(self.filepath), fraction * 100)
+        if fraction > 0.01:
+            elapsed = time.perf_counter() - self._started
+            text += ", %ds left" % (elapsed * (1 - fraction) / fraction)
+        return text + " (Esc to cancel)"
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self._steps.close()
+            self._endModal(context)
+            self._import.removeCreatedData()
+            self.report({'WARNING'}, "Import of X-Plane OBJ cancelled")
+            return {'CANCELLED'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        try:
+            running = self._runSlice()
+        except XPlaneImport.ParseError as e:
+            logger.error("%s", e.message())
+            self._endModal(context)
+            self._import.removeCreatedData()
+            return {'CANCELLED'}
+        except BaseException:
+            self._endModal(context)
+            self._import.removeCreatedData()
+            raise
+        if running:
+            context.workspace.status_text_set(self._statusText())
+            return {'RUNNING_MODAL'}
+
+        self._endModal(context)
+        self.report({'INFO'}, "Import of X-Plane OBJ finished, %s primitives." % self._import.nprim)
+        self._reportProfile(self.filepath, self._import.profile, self._pythonProfile)
+        return {'FINISHED'}
+
+def menu_function_import(self, context):
+    self.layout.operator(ImportXObjFile.bl_idname,
+        text="Import X-Plane OBJ (.obj)")
@@ -0,0 +1,848 @@
+# ------------------------------------------------------------------------
+# X-Plane OBJ8 parser
+# Based on XPlaneImport from XPlane2Blender 3.10 by Jonathan Harris
+#
+# OBJparser turns the lines of a file into Events for the stages of
+# XPStages. Big geometry blocks and batches of files are parsed by worker
+# processes without bpy, see _parseChunk() and parseFiles().
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import multiprocessing
+import os
+import re
+import time
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from .XPlaneUtils import Vertex, UV, ArrayBuffer
+from .XPObjects import XPRootObject
+from .XPStages import Event, StatsStage, MaterialStage, GeometryStage, TreeStage
+from .XPTokenizer import OBJTokenizer
+from .XPProfile import ImportProfile
+from .XPLog import ImportLogging
+
+from os.path import abspath
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python 3.7 of Blender before 2.93, blocks are read line by line
+    shared_memory = None
+
+
+# ------------------------------------------------------------------------
+# -- ParseError --
+# ------------------------------------------------------------------------
+
+class ParseError(Exception):
+    def __init__(self, type, value=""):
+        self.type = type
+        self.value = value
+        self.lineno = 0  # set by OBJparser.parse()
+
+    HEADER = 0
+    TOKEN = 1
+    INTEGER = 2
+    FLOAT = 3
+    NAME = 4
+    MISC = 5
+    PANEL = 6
+    TEXT = ["Header", "Command", "Integer", "Number", "Name", "Misc", "Panel"]
+
+    def message(self):
+        lineno = self.lineno
+        if self.type == ParseError.HEADER:
+            msg = 'This is not a valid X-Plane v8 OBJ file'
+        elif self.type == ParseError.PANEL:
+            msg = 'Cannot read cockpit panel texture'
+        elif self.type == ParseError.NAME:
+            msg = 'Missing dataref or light name at line %s\n' % lineno
+        elif self.type == ParseError.MISC:
+            msg = '%s at line %s' % (self.value, lineno)
+        else:
+            thing = ParseError.TEXT[self.type]
+            if self.value:
+                msg = 'Expecting a %s, found "%s" at line %s' % (thing, self.value, lineno)
+            else:
+                msg = 'Missing %s at line %s' % (thing, lineno)
+        return msg
+
+
+# ------------------------------------------------------------------------
+# -- Geometry blocks --
+# ------------------------------------------------------------------------
+
+# Start of the first line after a VT or IDX block, i.e. of a line with other command
+BLOCK_END = {
+    'VT': re.compile(rb'[\r\n][ \t]*(?!VT\s)\S'),
+    'IDX': re.compile(rb'[\r\n][ \t]*(?!IDX(?:10)?\s)\S'),
+}
+
+
+def vertexRows(tokens):
+    """Returns float32 VT rows of 8 values per row, rotated to Blender axes."""
+    try:
+        block = numpy.array(tokens, dtype=numpy.float32).reshape(-1, 8)
+    except ValueError as e:
+        raise ParseError(ParseError.FLOAT, str(e))
+
+    # Rotate vertices and normals to Blender format
+    for i in (0, 3):
+        block[:, i:i + 3] = block[:, [i, i + 2, i + 1]]
+        block[:, i + 1] *= -1
+    numpy.round(block[:, 0:6], Vertex.ROUND, out=block[:, 0:6])
+    return block
+
+
+def _chunkTokens(data, command):
+    # Returns arguments of all lines of a VT or IDX chunk and numbers of commands
+    if b'#' not in data and b'//' not in data:
+        # Numbers never contain the command names, drop them before splitting
+        if command == 'VT':
+            count = data.count(b'VT')
+            tokens = data.replace(b'VT', b'').split()
+            if len(tokens) == 8 * count == 8 * len(data.splitlines()):
+                return tokens, {'VT': count}
+        else:
+            idx10 = data.count(b'IDX10')
+            return data.replace(b'IDX10', b'').replace(b'IDX', b'').split(), \
+                {'IDX': data.count(b'IDX') - idx10, 'IDX10': idx10}
+    # Comments or broken lines, split line by line
+    tokens = []
+    commands = dict.fromkeys(('VT',) if command == 'VT' else ('IDX', 'IDX10'), 0)
+    for line in data.splitlines():
+        line = OBJTokenizer.split(line)
+        if line and line[0].decode('utf-8', 'replace') in commands:
+            commands[line[0].decode()] += 1
+            tokens.extend(line[1:9] if command == 'VT' else line[1:])
+    return tokens, commands
+
+
+def _badLine(data, command, eol):
+    # Number of line ends in data before the first VT or IDX line whose
+    # arguments can't be converted
+    (counts, dtype) = ({'VT': 8}, numpy.float32) if command == 'VT' else ({'IDX': 1, 'IDX10': 10}, numpy.int32)
+    for (n, line) in enumerate(data.split(eol)):
+        line = OBJTokenizer.split(line)
+        count = counts.get(line[0].decode('utf-8', 'replace')) if line else None
+        if count is None:
+            continue
+        args = line[1:9] if command == 'VT' else line[1:]
+        try:
+            if len(args) < count:
+                return n
+            numpy.array(args, dtype=dtype)
+        except ValueError:
+            return n
+    return 0
+
+
+def _parseChunk(filename, start, end, command, eol):
+    # Runs in a worker process: parses lines start..end of a block into a
+    # shared memory segment, which the parser copies and removes. lineno of
+    # a ParseError is the line of the error within the chunk, from 0.
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    (tokens, commands) = _chunkTokens(data, command)
+    try:
+        if command == 'VT':
+            rows = vertexRows(tokens)
+        else:
+            try:
+                rows = numpy.array(tokens, dtype=numpy.int32)
+            except ValueError as e:
+                raise ParseError(ParseError.INTEGER, str(e))
+    except ParseError as e:
+        e.lineno = _badLine(data, command, eol)
+        raise
+    segment = shared_memory.SharedMemory(create=True, size=max(rows.nbytes, 1))
+    numpy.ndarray(rows.shape, dtype=rows.dtype, buffer=segment.buf)[:] = rows
+    segment.close()
+    return segment.name, rows.shape, rows.dtype.str, commands, data.count(eol)
+
+
+def _takeChunk(name, shape, dtype, *info):
+    segment = shared_memory.SharedMemory(name=name)
+    try:
+        return numpy.ndarray(shape, dtype=dtype, buffer=segment.buf).copy()
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+def _discardChunks(futures):
+    # Remove shared memory of chunks after an error
+    for future in futures:
+        if not future.cancel() and future.exception() is None:
+            _takeChunk(*future.result())
+
+
+# ------------------------------------------------------------------------
+# -- Command registry --
+# ------------------------------------------------------------------------
+
+# OBJ command -> (reader, block). reader(parser, command) reads the arguments
+# from parser.line and returns the tuple of Event arguments, or for a block
+# of several lines an iterator of Events. Names ending with '*' stand for
+# all commands with that prefix, e.g. 'ATTR_*'. Built-in commands are
+# registered after OBJparser.
+COMMANDS = {}
+
+
+def registerCommand(name, reader, block=False):
+    """Makes the parser yield events of command name, e.g. for an extension stage.
+
+    Batch parse workers import this module again, they know only commands
+    registered on import of the extension module.
+    """
+    COMMANDS[name] = (reader, block)
+
+
+def unregisterCommand(name):
+    COMMANDS.pop(name, None)
+
+
+def rawArguments(parser, command):
+    # Reader of commands without own conversion, arguments stay strings
+    return tuple(arg.decode('utf-8', 'replace') for arg in parser.line)
+
+
+def _unrecognised(parser, command):
+    parser.warn('Unrecognised Command "%s"', command)
+    return tuple(parser.line)
+
+
+# ------------------------------------------------------------------------
+# -- OBJparser --
+# ------------------------------------------------------------------------
+class OBJparser(ImportLogging):
+    CHUNK_BYTES = 4 * 1024 * 1024  # size of a chunk of VT or IDX lines parsed by one worker process
+    BLOCK_LINES = 16384  # VT or IDX lines of one event of a block read line by line
+    STEP_SECONDS = 0.01  # time of one step of parseSteps()
+
+    # Attributes holding the result of parsing, see OBJimport.adoptParse()
+    RESULTS = ('fileformat', 'vt', 'idx', 'vline', 'vlight', 'log', 'warnings', 'imageName', 'litTexName', 'normalTexName',
+               'xpRootObject', 'emptyCount', 'animationCount', 'meshCount')
+
+    # ------------------------------------------------------------------------
+    def __init__(self, filename):
+        # verbose - level of verbosity in console: 0-warnings,1-normal,2-chat,3-debug
+        self.verbose = 1
+
+        # if filename[0:2] in ['//', '\\\\']:
+        #     # relative to .blend file
+        #     self.filename = normpath(join(dirname(Blender.Get('filename')),
+        #                                   filename[2:]))
+        # else:
+        #     self.filename = abspath(filename)
+
+        self.filename = abspath(filename)
+        # if sep == '\\':
+        #     if self.filename[0] in ['/', '\\']:
+        #         # Add Windows drive letter
+        #         (drive, foo) = splitdrive(Blender.sys.progname)
+        #         self.filename = drive.lower()+self.filename
+        #     else:
+        #         # Lowercase Windows drive lettter
+        #         self.filename = filename[0].lower()+self.filename[1:]
+        self.filename = filename[0].lower() + self.filename[1:]
+
+        self.file = None  # OBJTokenizer of input file
+        self.filelen = 0  # for progress reports
+        self.line = None  # current input line: command and list of bytes arguments
+        self.lineno = 0  # for error reporting
+        self.progress = -1
+        self.fileformat = 0  # 6, 7 or 8
+        self.log = []  # texts of warnings, see XPLog
+        self.warnings = {}  # warning format -> number of occurrences
+
+        # v8 structures
+        # VT rows are [x, y, z, nx, ny, nz, s, t] already rotated to Blender axes
+        self.vtBuffer = ArrayBuffer(numpy.float32, 8)
+        self.idxBuffer = ArrayBuffer(numpy.int32)
+        self.vt = self.vtBuffer.array()
+        self.vline = []
+        self.vlight = []
+        self.idx = self.idxBuffer.array()
+        self.pendingLine = False  # self.line is already read and is waiting for dispatch
+        self.geometry = True  # convert VT and IDX blocks, see events()
+        self.pointCounts = None  # (VT, VLINE, LIGHTS, IDX) of POINT_COUNTS
+
+        # Big VT and IDX blocks of a single file are parsed in chunks by worker processes
+        self.chunkWorkers = 0  # number of processes, 0 or 1 - no chunks
+        self.executable = None  # Python interpreter for workers, when sys.executable isn't one
+        self._chunkPool = None
+
+        self.imageName = None  # texture image name, if there is one
+        self.litTexName = None  # Lit texture filename
+        self.normalTexName = None  # NormalMap texture filename
+
+        self.xpRootObject = XPRootObject(self)  # Root object for imported objects, see TreeStage
+
+        self.emptyCount = 0  # Count of empty objects for animations
+        self.animationCount = 0  # Count of animation objects
+        self.meshCount = 0  # Count of mesh objects
+
+        self.profile = ImportProfile(enabled=False)  # see XPProfile, enabled for profiling only
+
+    # ------------------------------------------------------------------------
+    def _progress(self, value):
+        # Progress of parsing in range 0..0.5, shown by OBJimport
+        pass
+
+    # ------------------------------------------------------------------------
+    def stages(self):
+        """Returns consumers of the events of parse(), see XPStages."""
+        return [StatsStage(self), MaterialStage(self), GeometryStage(self), TreeStage(self)]
+
+    # ------------------------------------------------------------------------
+    def parse(self, stages=None):
+        """Reads the file and passes every event to stages, by default to stages().
+
+        VT and IDX blocks are converted only if a stage needs geometry.
+        """
+        for step in self.parseSteps(stages):
+            pass
+
+    def parseSteps(self, stages=None):
+        # Generator of parse(), yields after events of about STEP_SECONDS, so
+        # the caller can split parsing into short time slices
+        if stages is None:
+            stages = self.stages()
+        events = self.events(geometry=any(stage.geometry for stage in stages))
+        try:
+            finished = False
+            while not finished:
+                finished = True
+                deadline = time.perf_counter() + OBJparser.STEP_SECONDS
+                with self.profile.phase('tokenize'):
+                    for event in events:
+                        for stage in stages:
+                            stage.consume(event)
+                        if time.perf_counter() >= deadline:
+                            finished = False
+                            break
+                yield
+        except ParseError as e:
+            e.lineno = self.lineno
+            raise
+        finally:
+            events.close()
+        for stage in stages:
+            stage.finish()
+
+    # ------------------------------------------------------------------------
+    def events(self, geometry=True):
+        """Yields Event for every command of the file.
+
+        geometry - False skips conversion of VT and IDX blocks, their events have no rows
+        """
+        self.file = OBJTokenizer(self.filename)
+        self.filelen = max(self.file.size, 1)
+        self.geometry = geometry
+        try:
+            with self.profile.phase('header'):
+                self._readHeader()
+            yield from self._readObjects()
+        finally:
+            self.file.close()
+            self.file = None
+            if self._chunkPool is not None:
+                self._chunkPool.shutdown()
+                self._chunkPool = None
+
+    # ------------ Helper functions -------------------------------------------
+
+    def _getCR(self, optional=False):
+        if self.pendingLine:
+            self.pendingLine = False
+            return True
+        while True:
+            line = self.file.readline()
+            self.lineno = self.file.lineno
+            if line is None:
+                if optional:
+                    return False
+                else:
+                    raise ParseError(ParseError.MISC, 'Unexpected <EOF>')
+            # special comments are returned as a single token
+            self.line = OBJTokenizer.split(line)
+            if self.line:
+                self.line[0] = self.line[0].decode('utf-8', 'replace')
+                if self.verbose > 2:
+                    self.trace('Input:\t%s', self.line)
+                return True
+            elif not optional:
+                raise ParseError(ParseError.MISC, 'Unexpected <EOL>')
+
+    # ------------------------------------------------------------------------
+    def _getInput(self, optional=False):
+        try:
+            return self.line.pop(0).decode('utf-8', 'replace')
+        except IndexError:
+            if optional:
+                return None
+            else:
+                raise ParseError(ParseError.MISC, "getInput: IndexError")
+
+    # ------------------------------------------------------------------------
+    def _getVertex(self):
+        v = [self._getFloat() for i in range(3)]
+        # Rotate to Blender format
+        return Vertex(round(v[0], Vertex.ROUND),
+                      round(-v[2], Vertex.ROUND),
+                      round(v[1], Vertex.ROUND))
+
+    # ------------------------------------------------------------------------
+    def _getUV(self):
+        u = self._getFloat()
+        v = self._getFloat()
+        return UV(u, v)
+
+    # ------------------------------------------------------------------------
+    def _getFloat(self, optional=False):
+        try:
+            return float(self.line.pop(0))
+        except IndexError as e:
+            if optional:
+                return 0
+            raise ParseError(ParseError.FLOAT, str(e))
+        except ValueError as e:
+            if optional:
+                return 0
+            raise ParseError(ParseError.FLOAT, str(e))
+
+    # ------------------------------------------------------------------------
+    def _getInt(self):
+        try:
+            return int(self.line.pop(0))
+        except IndexError as e:
+            raise ParseError(ParseError.INTEGER, str(e))
+        except ValueError as e:
+            raise ParseError(ParseError.INTEGER, str(e))
+
+    # ------------------------------------------------------------------------
+    def _blockEnd(self, command):
+        # Position of the first line after the VT or IDX block being read
+        match = BLOCK_END[command].search(self.file.data, self.file.pos)
+        return match.start() + 1 if match else self.file.size
+
+    def _skipBlock(self, t):
+        # Event with counted lines of the rest of a block, without conversion
+        end = self._blockEnd('VT' if t == 'VT' else 'IDX')
+        data = self.file.data[self.file.pos:end]
+        if t == 'VT':
+            lines = {'VT': data.count(b'VT') + 1}
+        else:
+            idx10 = data.count(b'IDX10')
+            lines = {'IDX': data.count(b'IDX') - idx10, 'IDX10': idx10}
+            lines[t] += 1
+        self.file.lineno += data.count(self.file.eol)
+        self.file.pos = end
+        self.lineno = self.file.lineno
+        return Event('VT' if t == 'VT' else 'IDX', (None, lines))
+
+    # ------------------------------------------------------------------------
+    def _chunkBounds(self, command):
+        # Bounds of chunks of the rest of a big block, None for small blocks
+        # which are read line by line
+        if self.chunkWorkers <= 1 or shared_memory is None:
+            return None
+        start = self.file.pos
+        end = self._blockEnd(command)
+        if end - start < 2 * OBJparser.CHUNK_BYTES:
+            return None
+
+        # Split at line ends
+        bounds = [start]
+        while bounds[-1] < end:
+            split = self.file.data.find(self.file.eol, min(bounds[-1] + OBJparser.CHUNK_BYTES, end - 1), end)
+            bounds.append(end if split < 0 else split + 1)
+        return bounds
+
+    def _readChunks(self, t, first, bounds):
+        """Yields events of a big VT or IDX block parsed in worker processes.
+
+        first - arguments of the first line, which is already read
+        """
+        command = 'VT' if t == 'VT' else 'IDX'
+        self.debug('Parsing %s %s block in %s chunks', command, bounds[-1] - bounds[0], len(bounds) - 1)
+
+        if self._chunkPool is None:
+            context = multiprocessing.get_context('spawn')
+            if self.executable:
+                context.set_executable(self.executable)
+            self._chunkPool = ProcessPoolExecutor(max_workers=self.chunkWorkers, mp_context=context)
+        futures = [self._chunkPool.submit(_parseChunk, self.filename, bounds[i], bounds[i + 1], command, self.file.eol)
+                   for i in range(len(bounds) - 1)]
+
+        taken = 0
+        try:
+            with self.profile.phase('geometry'):
+                if command == 'VT':
+                    rows = vertexRows(first)
+                else:
+                    try:
+                        rows = numpy.array(first, dtype=numpy.int32)
+                    except ValueError as e:
+                        raise ParseError(ParseError.INTEGER, str(e))
+            yield Event(command, (rows, {t: 1}))
+            for future in futures:
+                with self.profile.phase('geometry'):
+                    try:
+                        result = future.result()
+                    except ParseError as e:
+                        # Chunk starts after the last counted line
+                        self.lineno = self.file.lineno + 1 + e.lineno
+                        raise
+                    rows = _takeChunk(*result)
+                taken += 1
+                self.file.lineno += result[4]
+                self.lineno = self.file.lineno
+                yield Event(command, (rows, result[3]))
+        except BaseException:
+            # Also when the consumer stops, e.g. after an error
+            _discardChunks(futures[taken:])
+            raise
+
+        self.file.pos = bounds[-1]
+
+    # ------------------------------------------------------------------------
+    def _readVertexBlock(self, t):
+        # Collect all contiguous VT lines and convert them in one go
+        if not self.geometry:
+            yield self._skipBlock('VT')
+            return
+        if len(self.line) >= 8:
+            bounds = self._chunkBounds('VT')
+            if bounds is not None:
+                yield from self._readChunks('VT', self.line[:8], bounds)
+                return
+        tokens = []
+        start = self._lineStart()
+        while True:
+            if len(self.line) < 8:
+                raise ParseError(ParseError.FLOAT, "VT: expected 8 values")
+            tokens.extend(self.line[:8])
+            if not self._getCR(True):
+                break
+            if self.line[0] != 'VT':
+                self.pendingLine = True
+                break
+            del self.line[0]
+            if len(tokens) >= 8 * OBJparser.BLOCK_LINES:
+                # Keep events of long blocks short
+                yield self._vertexEvent(tokens, start)
+                tokens = []
+                start = self._lineStart()
+
+        yield self._vertexEvent(tokens, start)
+
+    def _vertexEvent(self, tokens, start):
+        with self.profile.phase('geometry'):
+            try:
+                block = vertexRows(tokens)
+            except ParseError:
+                self._findBadLine('VT', start)
+                raise
+        return Event('VT', (block, {'VT': len(block)}))
+
+    # ------------------------------------------------------------------------
+    def _readIndexBlock(self, t):
+        # Collect all contiguous IDX and IDX10 lines and convert them in one go
+        if not self.geometry:
+            yield self._skipBlock(t)
+            return
+        count = 10 if t == 'IDX10' else 1
+        if len(self.line) >= count:
+            bounds = self._chunkBounds('IDX')
+            if bounds is not None:
+                yield from self._readChunks(t, self.line[:count], bounds)
+                return
+        tokens = []
+        lines = {'IDX': 0, 'IDX10': 0}
+        start = self._lineStart()
+        while True:
+            count = 10 if t == 'IDX10' else 1
+            if len(self.line) < count:
+                raise ParseError(ParseError.INTEGER, "%s: expected %s values" % (t, count))
+            tokens.extend(self.line[:count])
+            lines[t] += 1
+            if not self._getCR(True):
+                break
+            t = self.line[0]
+            if t not in ('IDX', 'IDX10'):
+                self.pendingLine = True
+                break
+            del self.line[0]
+            if lines['IDX'] + lines['IDX10'] >= OBJparser.BLOCK_LINES:
+                # Keep events of long blocks short
+                yield self._indexEvent(tokens, lines, start)
+                tokens = []
+                lines = {'IDX': 0, 'IDX10': 0}
+                start = self._lineStart()
+
+        yield self._indexEvent(tokens, lines, start)
+
+    def _indexEvent(self, tokens, lines, start):
+        with self.profile.phase('geometry'):
+            try:
+                block = numpy.array(tokens, dtype=numpy.int32)
+            except ValueError as e:
+                self._findBadLine('IDX', start)
+                raise ParseError(ParseError.INTEGER, str(e))
+        return Event('IDX', (block, lines))
+
+    def _lineStart(self):
+        # Offset and number of the current line, see _findBadLine()
+        return self.file.data.rfind(self.file.eol, 0, self.file.pos - 1) + 1, self.lineno
+
+    def _findBadLine(self, command, start):
+        # Sets lineno to the line of a conversion error in the block lines
+        # read since start, blocks are converted after their last line
+        (pos, lineno) = start
+        self.lineno = lineno + _badLine(self.file.data[pos:self.file.pos], command, self.file.eol)
+
+    # ------------------------------------------------------------------------
+    def _getCol(self):
+        if self.fileformat < 8:
+            return [self._getFloat() / 10.0 for i in range(3)]
+        else:
+            return [self._getFloat() for i in range(3)]
+
+    # ------------ Reading header of OBJ file ---------------------------------
+    def _readHeader(self):
+        c = (self.file.readline() or b'').strip()
+        self.trace('Input:\t"%s"', c)
+        if not c in [b'A', b'I']:
+            raise ParseError(ParseError.HEADER)
+
+        c = (self.file.readline() or b'').split()
+        self.lineno = 2
+        if not c:
+            raise ParseError(ParseError.HEADER)
+        self.trace('Input:\t"%s"', c[0])
+        if c[0] == b"800":
+            if OBJTokenizer.split(self.file.readline() or b'')[:1] != [b"OBJ"]:
+                raise ParseError(ParseError.HEADER)
+            self.fileformat = 8
+            self.lineno = 3
+            self.debug("This is an X-Plane v8 format file")
+        else:
+            raise ParseError(ParseError.HEADER)
+
+    # ------------ Reading objects --------------------------------------------
+    def _findReader(self, t):
+        # Registered prefix of t with the longest match, if any
+        prefixes = [name for name in COMMANDS if name.endswith('*') and t.startswith(name[:-1])]
+        if prefixes:
+            return COMMANDS[max(prefixes, key=len)]
+        return (_unrecognised, False)
+
+    def _readObjects(self):
+        readers = {name: handler for (name, handler) in COMMANDS.items() if not name.endswith('*')}
+        hits = self.profile.handlerHits
+        seconds = self.profile.handlerSeconds
+        timed = self.profile.enabled
+        while True:
+            pos = self.file.pos
+            progress = pos * 50 // self.filelen
+            # only update progress bar if need to
+            if self.progress != progress:
+                self._progress(float(pos) * 0.5 / self.filelen)
+                self.progress = progress
+
+            if not self._getCR(True):
+                break
+
+            t = self.line.pop(0)
+            if t == 'end':
+                yield Event(t, ())
+                break
+
+            handler = readers.get(t)
+            if handler is None:
+                handler = readers[t] = self._findReader(t)
+            (reader, block) = handler
+            hits[t] += 1
+            if not block:
+                if timed:
+                    start = time.perf_counter()
+                    args = reader(self, t)
+                    seconds[t] += time.perf_counter() - start
+                else:
+                    args = reader(self, t)
+                yield Event(t, args)
+                continue
+
+            # Time of blocks doesn't include consumers of their events
+            events = iter(reader(self, t))
+            try:
+                while True:
+                    start = time.perf_counter() if timed else 0
+                    event = next(events, None)
+                    if timed:
+                        seconds[t] += time.perf_counter() - start
+                    if event is None:
+                        break
+                    yield event
+            finally:
+                if hasattr(events, 'close'):
+                    events.close()
+
+    # ------------------------------------------------------------------------
+    def _readTexture(self, t):
+        return (self._getInput(optional=True),)
+
+    def _readPointCounts(self, t):
+        return tuple(self._getInt() for i in range(4))
+
+    def _readVLine(self, t):
+        v = self._getVertex()
+        c = self._getCol()
+        return (v, c)
+
+    def _readTris(self, t):
+        a = self._getInt()
+        b = self._getInt()
+        return (a, b)
+
+    def _readNothing(self, t):
+        return ()
+
+    def _readAnimTrans(self, t):
+        p1 = self._getVertex()
+        p2 = self._getVertex()
+        v1 = self._getFloat(optional=True)
+        v2 = self._getFloat(optional=True)
+        datarefName = self._getInput(optional=True)
+        return (p1, p2, v1, v2, datarefName)
+
+    def _readAnimRotate(self, t):
+        p = self._getVertex()
+        r1 = self._getFloat()  # start angle
+        r2 = self._getFloat()  # stop angle
+        v1 = self._getFloat(optional=True)  # start value
+        v2 = self._getFloat(optional=True)  # stop value
+        datarefName = self._getInput(optional=True)
+        return (p, r1, r2, v1, v2, datarefName)
+
+    def _readRotateBegin(self, t):
+        p = self._getVertex()
+        datarefName = self._getInput()
+        return (p, datarefName)
+
+    def _readRotateKey(self, t):
+        v = self._getFloat()
+        r = self._getFloat()
+        return (v, r)
+
+    def _readTransBegin(self, t):
+        return (self._getInput(),)
+
+    def _readTransKey(self, t):
+        v = self._getFloat()  # Value
+        p = self._getVertex()  # Position
+        return (v, p)
+
+
+for (name, reader) in (
+        ('TEXTURE', OBJparser._readTexture),
+        ('TEXTURE_LIT', OBJparser._readTexture),
+        ('TEXTURE_NORMAL', OBJparser._readTexture),
+        ('POINT_COUNTS', OBJparser._readPointCounts),
+        ('VLINE', OBJparser._readVLine),
+        ('TRIS', OBJparser._readTris),
+        ('ANIM_begin', OBJparser._readNothing),
+        ('ANIM_end', OBJparser._readNothing),
+        ('ANIM_trans', OBJparser._readAnimTrans),
+        ('ANIM_rotate', OBJparser._readAnimRotate),
+        ('ANIM_rotate_begin', OBJparser._readRotateBegin),
+        ('ANIM_rotate_key', OBJparser._readRotateKey),
+        ('ANIM_rotate_end', OBJparser._readNothing),
+        ('ANIM_trans_begin', OBJparser._readTransBegin),
+        ('ANIM_trans_key', OBJparser._readTransKey),
+        ('ANIM_trans_end', OBJparser._readNothing)):
+    registerCommand(name, reader)
+for (name, reader) in (
+        ('VT', OBJparser._readVertexBlock),
+        ('IDX', OBJparser._readIndexBlock),
+        ('IDX10', OBJparser._readIndexBlock)):
+    registerCommand(name, reader, block=True)
+
+
+# ------------------------------------------------------------------------
+# -- Batch parsing --
+# ------------------------------------------------------------------------
+
+def parseFile(filename, verbose=0, profile=False):
+    parser = OBJparser(filename)
+    parser.verbose = verbose
+    parser.profile = ImportProfile(enabled=profile)
+    parser.parse()
+    # Buffers are not needed any more, results are views into them
+    parser.vtBuffer = parser.idxBuffer = None
+    return parser
+
+
+def _futureResult(future):
+    try:
+        return future.result(), None
+    except (ParseError, OSError) as e:
+        return None, e
+
+
+def _parseResult(filename, verbose, profile):
+    try:
+        return parseFile(filename, verbose, profile), None
+    except (ParseError, OSError) as e:
+        return None, e
+
+
+def _collectResults(filenames, cached, results, cache):
+    for filename in filenames:
+        if filename in cached:
+            yield filename, cached[filename], None
+        else:
+            (parser, error) = next(results)
+            if parser is not None and cache is not None:
+                cache.store(filename, parser)
+            yield filename, parser, error
+
+
+def parseFiles(filenames, workers=0, verbose=0, executable=None, cache=None, profile=False):
+    """Parses files in worker processes.
+
+    Yields (filename, parser, error) in the order of filenames, where error is
+    the ParseError or OSError raised for that file.
+    workers - number of processes, 0 means one per CPU core
+    executable - Python interpreter for workers, when sys.executable isn't one
+    cache - ParseCache, files found there are not parsed again
+    profile - measure phases of parsing in parser.profile
+    """
+    filenames = list(filenames)
+    cached = {}
+    if cache is not None:
+        for filename in filenames:
+            parser = cache.load(filename)
+            if parser is not None:
+                cached[filename] = parser
+        cache.flush()
+    pending = [filename for filename in filenames if filename not in cached]
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+
+    if workers <= 1:
+        results = (_parseResult(filename, verbose, profile) for filename in pending)
+        yield from _collectResults(filenames, cached, results, cache)
+        return
+
+    context = multiprocessing.get_context('spawn')
+    if executable:
+        context.set_executable(executable)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(parseFile, filename, verbose, profile) for filename in pending]
+        results = (_futureResult(future) for future in futures)
+        yield from _collectResults(filenames, cached, results, cache)
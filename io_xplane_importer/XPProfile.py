@@ -0,0 +1,149 @@
+# ------------------------------------------------------------------------
+# Instrumentation of import phases
+#
+# ImportProfile records wall time and net allocated memory blocks of every
+# phase of an import, number of OBJ commands read, calls and time of their
+# readers and number of created Blender datablocks. Phases nest, time of
+# an inner phase is not counted for the outer one.
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import json
+import sys
+import time
+from collections import Counter
+
+PROFILE_VERSION = 2
+
+
+class _Phase:
+    __slots__ = ('profile', 'name', 'start', 'blocks')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.profile._enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.profile._exit(self)
+        return False
+
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+# ------------------------------------------------------------------------
+# -- ImportProfile --
+# ------------------------------------------------------------------------
+
+class ImportProfile:
+    PHASES = ('header', 'tokenize', 'geometry', 'objects', 'keyframes', 'materials', 'textures', 'cache')
+
+    def __init__(self, enabled=True):
+        # Disabled profile only counts commands and datablocks
+        self.enabled = enabled
+        self.seconds = dict.fromkeys(ImportProfile.PHASES, 0.0)
+        self.blocks = dict.fromkeys(ImportProfile.PHASES, 0)  # net allocated memory blocks
+        self.entries = dict.fromkeys(ImportProfile.PHASES, 0)
+        self.commands = Counter()  # OBJ command -> number of lines
+        self.handlerHits = Counter()  # OBJ command -> calls of its reader, blocks of lines count once
+        self.handlerSeconds = Counter()  # OBJ command -> time of its reader, only if enabled
+        self.datablocks = Counter()  # Blender type -> number of created datablocks
+        self.files = 0
+        self._stack = []
+
+    def __getstate__(self):
+        # Profiles of worker processes are sent back with parse results
+        state = dict(self.__dict__)
+        state['_stack'] = []
+        return state
+
+    # ------------------------------------------------------------------------
+    def phase(self, name):
+        """Returns context manager measuring a phase."""
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def _enter(self, phase):
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        if self._stack:
+            # Pause the outer phase
+            outer = self._stack[-1]
+            self.seconds[outer.name] += now - outer.start
+            self.blocks[outer.name] += blocks - outer.blocks
+        phase.start = now
+        phase.blocks = blocks
+        self.entries[phase.name] += 1
+        self._stack.append(phase)
+
+    def _exit(self, phase):
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        self._stack.pop()
+        self.seconds[phase.name] += now - phase.start
+        self.blocks[phase.name] += blocks - phase.blocks
+        if self._stack:
+            outer = self._stack[-1]
+            outer.start = now
+            outer.blocks = blocks
+
+    # ------------------------------------------------------------------------
+    def datablock(self, typeName, count=1):
+        self.datablocks[typeName] += count
+
+    # ------------------------------------------------------------------------
+    def merge(self, other):
+        # Add results of other profile, e.g. of parsing in a worker process
+        for name in ImportProfile.PHASES:
+            self.seconds[name] += other.seconds[name]
+            self.blocks[name] += other.blocks[name]
+            self.entries[name] += other.entries[name]
+        self.commands.update(other.commands)
+        self.handlerHits.update(other.handlerHits)
+        self.handlerSeconds.update(other.handlerSeconds)
+        self.datablocks.update(other.datablocks)
+
+    # ------------------------------------------------------------------------
+    def toDict(self):
+        return {
+            'version': PROFILE_VERSION,
+            'files': self.files,
+            'phases': {name: {'seconds': self.seconds[name],
+                              'allocatedBlocks': self.blocks[name],
+                              'entries': self.entries[name]} for name in ImportProfile.PHASES},
+            'commands': dict(self.commands.most_common()),
+            'handlers': {name: {'hits': hits, 'seconds': self.handlerSeconds[name]}
+                         for (name, hits) in self.handlerHits.most_common()},
+            'datablocks': dict(self.datablocks.most_common()),
+        }
+
+    def write(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.toDict(), f, indent=2)
+
+    # ------------------------------------------------------------------------
+    def report(self, top=5):
+        """Returns list of short lines for the operator report."""
+        lines = []
+        if self.enabled:
+            lines.append('Time: ' + ', '.join('%s %.3fs' % (name, self.seconds[name])
+                                              for name in ImportProfile.PHASES if self.entries[name]))
+            lines.append('Readers: ' + ', '.join('%s %.3fs' % item for item in self.handlerSeconds.most_common(top)))
+        lines.append('Commands: ' + ', '.join('%s %s' % item for item in self.commands.most_common(top)))
+        lines.append('Datablocks: ' + ', '.join('%s %s' % item for item in self.datablocks.most_common()))
+        return lines
@@ -0,0 +1,278 @@
+# ------------------------------------------------------------------------
+# Consumer stages of OBJ command events
+#
+# OBJparser.events() yields an Event for every command of a file and
+# OBJparser.parse() passes each one to a list of stages. Statistics,
+# textures, geometry buffers and the XPObject tree are separate stages,
+# so a consumer that needs only some of them doesn't pay for the others.
+#
+# Stages only fill results of the parser. Blender objects are created by
+# BuildStage of XPlaneImport, so these stages also run in worker processes.
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+from collections import namedtuple
+from functools import partial
+from math import radians
+from .XPlaneUtils import CurrentRotate, CurrentTranslate
+from .XPObjects import XPMesh, XPAnimation
+
+# command - name of the OBJ command, args - tuple of converted arguments:
+#   TEXTURE, TEXTURE_LIT, TEXTURE_NORMAL - file name or None
+#   POINT_COUNTS - VT, VLINE, LIGHTS, IDX counts
+#   VT - float32 rows or None, {'VT': lines}
+#   IDX - int32 indices or None, {'IDX': lines, 'IDX10': lines}
+#   VLINE - Vertex, colour
+#   TRIS - offset, count
+#   ANIM_trans - Vertex, Vertex, value, value, dataref
+#   ANIM_rotate - axis, start angle, stop angle, value, value, dataref
+#   ANIM_rotate_begin - axis, dataref; ANIM_rotate_key - value, angle
+#   ANIM_trans_begin - dataref; ANIM_trans_key - value, Vertex
+#   other commands - their arguments as bytes
+# One VT or IDX block may come in several events, rows are None if the
+# parse has no stage needing geometry.
+Event = namedtuple('Event', ('command', 'args'))
+
+BLOCKS = ('VT', 'IDX')  # events of several lines, last argument counts the lines
+
+
+# ------------------------------------------------------------------------
+# -- Stage --
+# ------------------------------------------------------------------------
+
+class Stage:
+    geometry = False  # True - needs rows of VT and IDX events
+
+    def __init__(self, parser):
+        self.parser = parser  # OBJparser, holds results
+        self.handlers = {}  # command -> callable taking the event arguments
+
+    def consume(self, event):
+        handler = self.handlers.get(event.command)
+        if handler is not None:
+            handler(*event.args)
+
+    def finish(self):
+        # Called after the last event
+        pass
+
+
+# ------------------------------------------------------------------------
+# -- StatsStage --
+# ------------------------------------------------------------------------
+
+class StatsStage(Stage):
+    # Counts lines of every command in profile.commands
+    def consume(self, event):
+        if event.command in BLOCKS:
+            self.parser.profile.commands.update(event.args[-1])
+        else:
+            self.parser.profile.commands[event.command] += 1
+
+
+# ------------------------------------------------------------------------
+# -- MaterialStage --
+# ------------------------------------------------------------------------
+
+class MaterialStage(Stage):
+    TEXTURES = {'TEXTURE': 'imageName', 'TEXTURE_LIT': 'litTexName', 'TEXTURE_NORMAL': 'normalTexName'}
+
+    def __init__(self, parser):
+        super().__init__(parser)
+        self.handlers = {t: partial(self.texture, t) for t in MaterialStage.TEXTURES}
+
+    def texture(self, command, texName):
+        if texName:
+            # Images are loaded when Blender objects are created
+            setattr(self.parser, MaterialStage.TEXTURES[command], texName)
+        else:
+            self.parser.info("No texture defined for %s", command)
+
+
+# ------------------------------------------------------------------------
+# -- GeometryStage --
+# ------------------------------------------------------------------------
+
+class GeometryStage(Stage):
+    geometry = True
+
+    def __init__(self, parser):
+        super().__init__(parser)
+        self.handlers = {
+            'POINT_COUNTS': self.pointCounts,
+            'VT': self.vertices,
+            'IDX': self.indices,
+            'VLINE': self.vline,
+        }
+
+    def pointCounts(self, *counts):
+        parser = self.parser
+        parser.pointCounts = counts
+        # Exact storage, buffers still grow if the counts are wrong
+        parser.vtBuffer.reserve(counts[0])
+        parser.idxBuffer.reserve(counts[3])
+
+    def vertices(self, rows, lines):
+        parser = self.parser
+        with parser.profile.phase('geometry'):
+            parser.vtBuffer.extend(rows)
+            parser.vt = parser.vtBuffer.array()
+
+    def indices(self, indices, lines):
+        parser = self.parser
+        with parser.profile.phase('geometry'):
+            parser.idxBuffer.extend(indices)
+            parser.idx = parser.idxBuffer.array()
+
+    def vline(self, v, c):
+        self.parser.vline.append((v, c))
+
+    def finish(self):
+        parser = self.parser
+        if parser.pointCounts is None:
+            return
+        if parser.pointCounts[0] != len(parser.vt) or parser.pointCounts[3] != len(parser.idx):
+            parser.warn('POINT_COUNTS %s VT and %s IDX, found %s and %s',
+                        parser.pointCounts[0], parser.pointCounts[3], len(parser.vt), len(parser.idx))
+
+
+# ------------------------------------------------------------------------
+# -- TreeStage --
+# ------------------------------------------------------------------------
+
+class TreeStage(Stage):
+    # Builds the XPObject tree under parser.xpRootObject
+    def __init__(self, parser):
+        super().__init__(parser)
+        self.animationChain = []  # List of ANIM parents
+        self.animParamStack = []  # Stack of anim params for mesh
+        self.currentrot = None  # current rotate_key axis, key and angles
+        self.currenttrans = None  # current trans_key, key and postions
+
+        self.handlers = {
+            'TRIS': self.tris,
+            'ANIM_begin': self.animBegin,
+            'ANIM_end': self.animEnd,
+            'ANIM_trans': self.animTrans,
+            'ANIM_rotate': self.animRotate,
+            'ANIM_rotate_begin': self.rotateBegin,
+            'ANIM_rotate_key': self.rotateKey,
+            'ANIM_rotate_end': self.rotateEnd,
+            'ANIM_trans_begin': self.transBegin,
+            'ANIM_trans_key': self.transKey,
+            'ANIM_trans_end': self.transEnd,
+        }
+
+    def isOpen(self):
+        # True inside ANIM_begin/ANIM_end, top level objects are finished otherwise
+        return len(self.animationChain) > 0
+
+    # ------------------------------------------------------------------------
+    def _addXPObject(self, xpObject):
+        if len(self.animationChain):
+            parent = self.animationChain[-1]
+            if len(parent.children):
+                parent = parent.children[-1]
+        else:
+            parent = self.parser.xpRootObject
+
+        parent.addChild(xpObject)
+
+    def _createMesh(self, t, a, b):
+        objdef = (t, a, b)
+        parser = self.parser
+
+        if t.find("Empty") >= 0:
+            name = t
+        else:
+            name = "Mesh_{}".format(parser.meshCount)
+            parser.meshCount += 1
+
+        mesh = XPMesh(name, objdef, parser)
+        # Adding params to mesh
+        if len(self.animParamStack):
+            for param in self.animParamStack[-1]:
+                mesh.addParam(param)
+            self.animParamStack[-1] = []
+
+        return mesh
+
+    # ------------------------------------------------------------------------
+    def tris(self, a, b):
+        self._addXPObject(self._createMesh('TRIS', a, b))
+
+    def animBegin(self):
+        parser = self.parser
+        mesh = None
+
+        if len(self.animationChain):
+            if len(self.animationChain[-1].children) == 0:
+                parser.debug("Prev Animation w/o mesh. Creating Empty object for it.")
+                mesh = self._createMesh("Empty_{}".format(parser.emptyCount), 0, 0)
+                parser.emptyCount += 1
+                self._addXPObject(mesh)
+            else:
+                mesh = self.animationChain[-1].children[-1]
+
+        xpAnim = XPAnimation("Animation_{}".format(parser.animationCount))
+        parser.animationCount += 1
+        if mesh is None:
+            self._addXPObject(xpAnim)
+        else:
+            mesh.addChild(xpAnim)
+
+        self.animationChain.append(xpAnim)
+        self.animParamStack.append([])
+
+        parser.debug('Append animation group. Chain len=%s', len(self.animationChain))
+
+    def animEnd(self):
+        # Clear params list
+        del self.animParamStack[-1]
+        del self.animationChain[-1]
+
+        self.parser.debug('Remove animation group. Chain len=%s', len(self.animationChain))
+
+    # ------------------------------------------------------------------------
+    def animTrans(self, p1, p2, v1, v2, datarefName):
+        # Adding trans params to the list:
+        # [0] - param name (ANIM_trans)
+        # [1] - List of positions
+        # [2] - List of values
+        # [4] - DataRef name
+        self.animParamStack[-1].append(['ANIM_trans', [p1, p2], [v1, v2], datarefName])
+
+    def animRotate(self, p, r1, r2, v1, v2, datarefName):
+        while r2 >= 360 or r2 <= -360:
+            # hack from old code
+            r2 /= 2
+            v2 /= 2
+
+        self.animParamStack[-1].append(['ANIM_rotate', p.totuple(), [radians(r1), radians(r2)], [v1, v2],
+                                        datarefName])
+
+    def rotateBegin(self, p, datarefName):
+        self.currentrot = CurrentRotate(p, datarefName)
+        self.parser.debug('Found ANIM_rotate_begin for dref %s.', datarefName)
+
+    def rotateKey(self, v, r):
+        self.currentrot.addKey(v, radians(r))
+
+    def rotateEnd(self):
+        self.parser.debug('Found ANIM_rotate_end for dref %s.', self.currentrot.dataRef)
+        self.animParamStack[-1].append(self.currentrot.toMeshParam())
+        self.currentrot = None
+
+    def transBegin(self, datarefName):
+        self.currenttrans = CurrentTranslate(datarefName)
+        self.parser.debug('Found ANIM_trans_begin for dref %s.', datarefName)
+
+    def transKey(self, v, p):
+        self.currenttrans.addKey(v, p)
+
+    def transEnd(self):
+        self.parser.debug('Found ANIM_trans_end for dref %s.', self.currenttrans.dataRef)
+        self.animParamStack[-1].append(self.currenttrans.toMeshParam())
+        self.currenttrans = None
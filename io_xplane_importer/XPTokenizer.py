@@ -0,0 +1,72 @@
+# ------------------------------------------------------------------------
+# Byte level tokenizer for X-Plane OBJ files
+#
+# This software is licensed under a Creative Commons License
+#   Attribution-Noncommercial-Share Alike 3.0
+#   http://creativecommons.org/licenses/by-nc-sa/3.0/
+
+import mmap
+import os
+
+
+# ------------------------------------------------------------------------
+# -- OBJTokenizer --
+# ------------------------------------------------------------------------
+
+class OBJTokenizer:
+    """Splits a memory-mapped OBJ file into lines and tokens.
+
+    Tokens are returned as bytes; float() and int() accept them directly,
+    names have to be decoded by the caller.
+    """
+
+    SPECIAL = b'####_'  # prefix of special comments, which are returned as a single token
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            # Empty files can't be mapped
+            self.data = b''
+        self.pos = 0  # offset of the next line
+        self.lineno = 0  # number of the last returned line
+
+        # Old Mac files use CR only line endings
+        head = self.data[:65536]
+        self.eol = b'\r' if b'\n' not in head and b'\r' in head else b'\n'
+
+    # ------------------------------------------------------------------------
+    def close(self):
+        if self.data:
+            self.data.close()
+            self.data = b''
+        self.file.close()
+
+    # ------------------------------------------------------------------------
+    def readline(self):
+        """Returns next raw line without line ending or None at the end of file."""
+        if self.pos >= self.size:
+            return None
+        end = self.data.find(self.eol, self.pos)
+        if end < 0:
+            end = self.size
+        line = self.data[self.pos:end]
+        self.pos = end + 1
+        self.lineno += 1
+        return line
+
+    # ------------------------------------------------------------------------
+    @staticmethod
+    def split(line):
+        """Returns tokens of raw line with comments removed."""
+        i = line.find(b'#')
+        if i >= 0:
+            if line.lstrip().startswith(OBJTokenizer.SPECIAL):
+                return [line.strip()]
+            line = line[:i]
+        i = line.find(b'//')
+        if i >= 0:
+            line = line[:i]
+        return line.split()
@@ -10,17 +10,24 @@
 import sys
 from math import sqrt, sin, cos, radians
 from os.path import exists, join
-import bpy
-# from Blender import Registry, Types, Image, Mesh, Object, Scene, Text, Window
-import mathutils
-from mathutils import Matrix, Vector, Euler
+import numpy
+try:
+    import bpy
+    # from Blender import Registry, Types, Image, Mesh, Object, Scene, Text, Window
+    import mathutils
+    from mathutils import Matrix, Vector, Euler
+except ImportError:
+    # Parse worker processes run outside of Blender and only use the plain data classes
+    bpy = mathutils = Matrix = Vector = Euler = None
 
 class Vertex:
+    __slots__ = ('x', 'y', 'z', 'faces')
+
     LIMIT = 0.0001  # max distance between vertices for them to be merged
     ROUND = 4  # Precision
 
     def __init__(self, x, y=None, z=None, mm=None):
-        self.faces = []  # indices into face array
+        self.faces = None  # indices into face array, created by addFace()
         # print("Vertex x:",x)
         #        if isinstance(x, Types.vectorType) or isinstance(x, Types.eulerType):
         #            mm=y
@@ -107,6 +114,8 @@ class Vertex:
         return self / hyp
 
     def addFace(self, v):
+        if self.faces is None:
+            self.faces = []
         self.faces.append(v)
 
     def totuple(self):
@@ -114,6 +123,8 @@ class Vertex:
 
 
 class UV:
+    __slots__ = ('s', 't')
+
     LIMIT = 0.0004  # <= 1 pixel in 2048
     ROUND = 4
 
@@ -162,6 +173,8 @@ class UV:
 
 
 class Face:
+    __slots__ = ('v', 'uv', 'flags', 'kosher', 'region')
+
     # Flags in v7 sort order
     HARD = 1
     TWOSIDE = 2
@@ -210,6 +223,35 @@ class Face:
         return len(self.v)
 
 
+class ArrayBuffer:
+    """Growable buffer of fixed width rows backed by a preallocated NumPy array."""
+
+    def __init__(self, dtype, width=1, capacity=1024):
+        self.width = width
+        self.count = 0
+        self.data = numpy.empty(self._shape(capacity), dtype=dtype)
+
+    def _shape(self, rows):
+        return (rows, self.width) if self.width > 1 else (rows,)
+
+    def reserve(self, rows):
+        if rows > len(self.data):
+            data = numpy.empty(self._shape(rows), dtype=self.data.dtype)
+            data[:self.count] = self.data[:self.count]
+            self.data = data
+
+    def extend(self, rows):
+        n = len(rows)
+        if self.count + n > len(self.data):
+            self.reserve(max(self.count + n, len(self.data) * 2))
+        self.data[self.count:self.count + n] = rows
+        self.count += n
+
+    def array(self):
+        # View of the filled part of the buffer
+        return self.data[:self.count]
+
+
 class PanelRegionHandler:
     NAME = 'PanelRegionHandler'
     REGIONCOUNT = 4  # X-Plane 9.00 allows up to 4 panel regions
@@ -588,7 +630,7 @@ class CurrentRotate:
             mxs.append(value[1])
             vals.append(value[0])
 
-        param = ["ANIM_rotate", self.vector.toVector(3), mxs, vals, self.dataRef]
+        param = ["ANIM_rotate", self.vector.totuple(), mxs, vals, self.dataRef]
         return param
 
 